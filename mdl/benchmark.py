@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+offline end-to-end benchmark with a local stand-in for the API, the CDN and zdf.de
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+
+# import modules
+modules = [
+    "mdl.mdl import mdownloader",
+]
+
+for module in modules:
+    try:
+        exec(f"from {module}")
+    except:
+        exec(f"from {module.split('.')[-1]}")
+
+##############
+
+SERIES_CLUSTER = 'Benchmark-Serien'
+
+def synthetic_mp4(size):
+    """
+    Gültige MP4-Boxstruktur (ftyp, mdat, moov) mit `size` Bytes.
+    """
+    ftyp = struct.pack('>I4s', 16, b'ftyp') + b'isom\x00\x00\x02\x00'
+    moov = struct.pack('>I4s', 108, b'moov') + b'\x00' * 100
+    payload = max(size - len(ftyp) - len(moov) - 8, 0)
+    return ftyp + struct.pack('>I4s', payload + 8, b'mdat') + os.urandom(payload) + moov
+
+class FakeMediathek:
+    """
+    Lokaler HTTP-Server als Ersatz für die Such-API (POST /api/query, seitenweise), das CDN
+    (GET/HEAD /video/..., mit Range-Anfragen) und die zdf.de-Serienseiten (/serien).
+
+    Der Datenbestand besteht aus `sources` Quellen, davon jede fünfte eine Folge einer Serie
+    (zehn Folgen pro Serie); auf der Serienübersicht stehen die ersten `listed_series` Serien.
+    """
+    def __init__(self, sources=1000, file_size=256 * 1024, listed_series=2):
+        self.file_size = file_size
+        self.listed_series = listed_series
+        self.sources = sources
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.video = synthetic_mp4(file_size)
+        self.cache = {}
+        self.server = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    @property
+    def api_url(self):
+        return f'{self.url}/api/query'
+
+    @property
+    def series_url(self):
+        return f'{self.url}/serien'
+
+    def _records(self):
+        base = int(time.time()) - 3600
+        records = []
+        for i in range(self.sources):
+            if i % 5 == 4:
+                series, episode = divmod(i // 5, 10)
+                name = f'Serie {series:04d}'
+                title, topic = f'{name} (S01/E{episode + 1:02d})', name
+                website = f'{self.series_url}/serie-{series:04d}/folge-{episode + 1}'
+            else:
+                title, topic = f'Film {i} - Spielfilm, Deutschland 2020', 'Spielfilm'
+                website = f'{self.url}/film/{i}'
+            records.append({
+                'id': f'bench{i:07d}',
+                'channel': 'ZDF',
+                'topic': topic,
+                'title': title,
+                'description': 'Benchmark',
+                'timestamp': base - i * 60,
+                'duration': 5400,
+                'size': self.file_size,
+                'url_website': website,
+                'url_subtitle': '',
+                'url_video': f'{self.url}/video/{i}.mp4',
+                'url_video_low': f'{self.url}/video/{i}_low.mp4',
+                'url_video_hd': f'{self.url}/video/{i}_hd.mp4',
+                'filmlisteTimestamp': str(base),
+            })
+        return records
+
+    def query(self, queries):
+        """
+        Alle Quellen, die jede Suchanfrage erfüllen (Begriff in einem der Felder, ohne Groß-/Kleinschreibung).
+        """
+        key = json.dumps(queries, sort_keys=True)
+        if key not in self.cache:
+            self.cache[key] = [
+                record for record in self.records
+                if all(any(query['query'].lower() in str(record.get(field, '')).lower() for field in query['fields']) for query in queries)
+            ]
+        return self.cache[key]
+
+    def count(self, kind):
+        with self.lock:
+            self.counts[kind] += 1
+
+    def _handler(self):
+        mediathek = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body=b'', content_type='text/html; charset=utf-8', headers=None, head=False):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                mediathek.count('api')
+                data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                results = mediathek.query(data.get('queries', []))
+                page = results[data.get('offset', 0):data.get('offset', 0) + data.get('size', 50)]
+                body = json.dumps({'result': {'results': page, 'queryInfo': {'totalResults': len(results)}}, 'err': None}).encode()
+                self._send(200, body, content_type='application/json')
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                if self.path.startswith('/video/'):
+                    mediathek.count('head' if head else 'video')
+                    return self._video(head)
+                mediathek.count('series')
+                if self.path == '/serien':
+                    links = ''.join(f'<a class="teaser-title-link" title="Serie {k:04d}">Serie {k:04d}</a>' for k in range(mediathek.listed_series))
+                    body = f'<html><body><article class="b-cluster"><h2 class="cluster-title">{SERIES_CLUSTER}</h2>{links}</article></body></html>'
+                    return self._send(200, body.encode(), head=head)
+                match = re.match(r'^/serien/serie-\d+/folge-(\d+)$', self.path)
+                if match:
+                    body = f'<html><body><span class="teaser-cat">Staffel 1, Folge {match.group(1)}</span></body></html>'
+                    return self._send(200, body.encode(), head=head)
+                self._send(404, head=head)
+
+            def _video(self, head):
+                data = mediathek.video
+                headers = {'Accept-Ranges': 'bytes', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if not match:
+                    return self._send(200, data, content_type='video/mp4', headers=headers, head=head)
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+                if start >= len(data):
+                    return self._send(416, headers={'Content-Range': f'bytes */{len(data)}'}, head=head)
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                self._send(206, data[start:end + 1], content_type='video/mp4', headers=headers, head=head)
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.records = self._records()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _measure(name, size, function, mediathek, db_path):
+    mediathek.counts.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        rows = function()
+    finally:
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+            'size': size,
+            'scenario': name,
+            'wall_s': round(wall, 3),
+            'rows': rows,
+            'api': mediathek.counts['api'],
+            'video': mediathek.counts['video'],
+            'head': mediathek.counts['head'],
+            'series': mediathek.counts['series'],
+            'db_mb': round(os.path.getsize(db_path) / 1024 / 1024, 2),
+            'peak_mem_mb': round(peak / 1024 / 1024, 2),
+            }
+
+def run_benchmark(sizes=(100, 1000, 5000), downloads=10, file_size=256 * 1024, listed_series=2, verbose=False, **options):
+    """
+    Misst get_links, download_movies und series_downloader gegen FakeMediathek für jede Größe
+    in einem frischen Konfigurations- und Download-Verzeichnis.
+
+    :param options: weitere Argumente für mdownloader (z.B. jobs, page_size)
+    :return: Liste von Ergebnissen je Größe und Szenario
+    """
+    report = []
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='mdl-benchmark-')
+        mediathek = FakeMediathek(sources=size, file_size=file_size, listed_series=listed_series).start()
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with output:
+                args = dict(
+                    configdir=os.path.join(workdir, 'config'),
+                    download=os.path.join(workdir, 'download'),
+                    api_url=mediathek.api_url,
+                    series_url=mediathek.series_url,
+                    search=None,
+                    channel='ZDF',
+                )
+                args.update(options)
+                m = mdownloader(**args)
+                db_path = os.path.join(m.args['configdir'], 'data.db')
+
+                def get_links():
+                    m.args['search'] = 'Spielfilm'
+                    m.get_links()
+                    return len(m.DF_links)
+
+                def download_movies():
+                    m.DF_links = m.DF_links.head(downloads)
+                    m.download_movies()
+                    return len(m.DF_links)
+
+                def series_downloader():
+                    m.args.update(series_filter=[SERIES_CLUSTER], run=True)
+                    m.series_downloader()
+                    return len(m.DF_links)
+
+                for name, function in [('get_links', get_links), ('download_movies', download_movies), ('series_downloader', series_downloader)]:
+                    report.append(_measure(name, size, function, mediathek, db_path))
+        finally:
+            mediathek.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of mdl against a local stand-in for the API, the CDN and zdf.de")
+    parser.add_argument("--sizes", help="Comma seperated number of sources in the fake API", default="100,1000,5000", type=str)
+    parser.add_argument("--downloads", help="Number of movies downloaded in the download_movies scenario", default=10, type=int)
+    parser.add_argument("--file-size", help="Size of every fake video in KB", default=256, type=int)
+    parser.add_argument("--series", help="Number of series listed on the fake series page", default=2, type=int)
+    parser.add_argument("--jobs", help="Number of parallel downloads", default=1, type=int)
+    parser.add_argument("--page-size", help="Number of results per API request", default=50, type=int)
+    parser.add_argument("--json", help="Write the report as JSON to this file", type=str)
+    parser.add_argument("--verbose", help="Show the output of mdl", action="store_true")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        sizes=[int(k) for k in args.sizes.split(',') if k.strip()],
+        downloads=args.downloads,
+        file_size=args.file_size * 1024,
+        listed_series=args.series,
+        verbose=args.verbose,
+        jobs=args.jobs,
+        page_size=args.page_size,
+    )
+    print(pd.DataFrame(report).to_string(index=False))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
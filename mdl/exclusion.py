@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exclusion of useless sources by title tags
+"""
+from sqlalchemy import and_, func, true
+
+EXCLUDED_TAGS = [
+                'Audiodeskription',
+                '(ita)',
+                '(Englisch)',
+                '(Französisch)',
+                '(dan)',
+                'Hörfassung',
+                '(Englische Originalfassung)',
+                '(Originalversion)',
+                'Originalversion',
+                'Originalfassung',
+                '(OV)',
+                '(heb)',
+                ]
+
+class ExclusionMatcher:
+    """
+    Schließt Quellen aus, deren Titel einen der Begriffe enthält (Groß-/Kleinschreibung beachtet,
+    kein Regex). Begriffe, die einen anderen Begriff enthalten, sind überflüssig und werden
+    verworfen; der Rest wird als Bedingung in die SQL-Abfragen übernommen.
+    """
+    def __init__(self, tags):
+        tags = sorted(set(k for k in tags if k), key=len)
+        self.tags = [k for i, k in enumerate(tags) if not any(shorter in k for shorter in tags[:i])]
+
+    def __bool__(self):
+        return bool(self.tags)
+
+    def sql_clause(self, column):
+        """
+        Die Bedingung als SQL-Ausdruck (instr beachtet Groß-/Kleinschreibung).
+        """
+        if not self.tags:
+            return true()
+        return and_(*[func.coalesce(func.instr(column, tag), 0) == 0 for tag in self.tags])
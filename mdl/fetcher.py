@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+download engines
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import requests
+
+# import modules
+modules = [
+    "mdl.pager import pooled_session",
+]
+
+for module in modules:
+    try:
+        exec(f"from {module}")
+    except:
+        exec(f"from {module.split('.')[-1]}")
+
+##############
+
+def _new_result(url, filename):
+    return {
+            'url': url,
+            'filename': filename,
+            'success': False,
+            'status': None,
+            'bytes': 0,
+            'resumed': 0,
+            'total': None,
+            'duration': 0.0,
+            'error': None,
+            'hash': None,
+            'ttfb': None,
+            'peak': None,
+            }
+
+def _content_range_total(value):
+    """
+    'bytes 100-199/2000' oder 'bytes */2000' -> 2000
+    """
+    match = re.search(r'/(\d+)\s*$', value or '')
+    return int(match.group(1)) if match else None
+
+class _Meter:
+    """
+    Misst die Zeit bis zum ersten Byte und die höchste Rate über Fenster von `window` Sekunden
+    (threadsicher, für segmentierte Downloads über alle Segmente).
+    """
+    def __init__(self, start, window=1.0):
+        self.start = start
+        self.window = window
+        self.ttfb = None
+        self.peak = 0.0
+        # das erste Fenster beginnt mit der Anfrage, sonst ergäben kurze Downloads absurde Raten
+        self.window_start = start
+        self.window_bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            if self.ttfb is None:
+                self.ttfb = now - self.start
+            self.window_bytes += amount
+            elapsed = now - self.window_start
+            if elapsed >= self.window:
+                self.peak = max(self.peak, self.window_bytes / elapsed)
+                self.window_start, self.window_bytes = now, 0
+
+    def finish(self, result):
+        with self.lock:
+            if self.window_bytes:
+                # angebrochenes Fenster (bzw. der ganze Download, wenn er kürzer als ein Fenster war)
+                elapsed = time.monotonic() - self.window_start
+                if elapsed > 0 and (not self.peak or elapsed >= self.window / 2):
+                    self.peak = max(self.peak, self.window_bytes / elapsed)
+            result['ttfb'] = self.ttfb
+            result['peak'] = self.peak or None
+
+class HttpDownloader:
+    """
+    Eingebaute Download-Engine: gepoolte Verbindungen, Schreiben in großen Blöcken und
+    Fortsetzen einer vorhandenen Datei per Range-Anfrage.
+
+    Mit segments > 1 werden große Dateien, deren Server Range-Anfragen unterstützt, in
+    `segments` Byte-Bereichen parallel in eine vorab angelegte (sparse) Datei geladen. Der
+    Fortschritt jedes Segments steht in '<datei>.state', damit exakt fortgesetzt werden kann.
+
+    Mit hash_algorithm (z.B. 'sha256') wird beim Schreiben ein Hash mitgerechnet; beim Fortsetzen
+    wird nur der vorhandene Anfang einmal gelesen. Segmentierte Downloads kommen nicht in
+    Reihenfolge an und werden nicht gehasht.
+    """
+    def __init__(self, session=None, timeout=30, connect_timeout=10, chunk_size=1 << 20, pool_size=10, bucket=None, segments=1, min_segment_size=16 << 20, hash_algorithm=None):
+        self.session = session or pooled_session(pool_size)
+        self.bucket = bucket
+        self.timeout = (min(connect_timeout, timeout), timeout)
+        self.chunk_size = chunk_size
+        self.segments = max(int(segments), 1)
+        self.min_segment_size = min_segment_size
+        self.hash_algorithm = hash_algorithm
+
+    def _hash_prefix(self, filename, length):
+        digest = hashlib.new(self.hash_algorithm)
+        with open(filename, 'rb') as f:
+            while length > 0:
+                block = f.read(min(self.chunk_size, length))
+                if not block:
+                    break
+                digest.update(block)
+                length -= len(block)
+        return digest
+
+    @staticmethod
+    def state_path(filename):
+        return f'{filename}.state'
+
+    def download(self, url, filename):
+        if self.segments > 1 or os.path.exists(self.state_path(filename)):
+            result = self._download_segmented(url, filename)
+            if result is not None:
+                return result
+        return self._download_stream(url, filename)
+
+    def _probe(self, url):
+        """
+        HEAD-Anfrage: (Content-Length, unterstützt Range) oder (None, False).
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+            length = response.headers.get('Content-Length')
+            if response.ok and length and length.isdigit():
+                return int(length), response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        except requests.RequestException:
+            pass
+        return None, False
+
+    def content_length(self, url):
+        """
+        Größe laut HEAD-Anfrage oder None.
+        """
+        return self._probe(url)[0]
+
+    def _load_state(self, url, filename):
+        try:
+            with open(self.state_path(filename)) as f:
+                state = json.load(f)
+            if state['url'] == url and os.path.exists(filename):
+                return state
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save_state(self, state, filename):
+        tmp = f'{self.state_path(filename)}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path(filename))
+
+    def _plan_segments(self, length, filename):
+        """
+        Teilt [0, length) in Segmente [start, end, erledigt]. Ein vorhandener, zusammenhängender
+        Anfang der Datei (aus einem normalen Download) zählt als erledigt.
+        """
+        prefix = os.path.getsize(filename) if os.path.exists(filename) else 0
+        count = max(min(self.segments, length // self.min_segment_size), 1)
+        size = -(-length // count)
+        segments = []
+        for start in range(0, length, size):
+            end = min(start + size, length) - 1
+            segments.append([start, end, min(max(prefix - start, 0), end - start + 1)])
+        return segments
+
+    def _download_segmented(self, url, filename):
+        """
+        Segmentierter Download; None, wenn der Server das nicht unterstützt oder die Datei zu
+        klein ist (dann wird normal geladen). Beantwortet der Server eine Range-Anfrage nicht
+        (mehr) mit 206, werden Zustand und sparse Datei verworfen und ebenfalls None geliefert.
+        """
+        state = self._load_state(url, filename)
+        if state is None:
+            if os.path.exists(self.state_path(filename)):
+                # veralteter Zustand: die (sparse) Datei ist nicht als Anfang verwendbar
+                os.remove(self.state_path(filename))
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+            length, ranges = self._probe(url)
+            if not ranges or length < 2 * self.min_segment_size:
+                return None
+            state = {'url': url, 'length': length, 'segments': self._plan_segments(length, filename)}
+
+        result = _new_result(url, filename)
+        result['total'] = state['length']
+        result['resumed'] = sum(done for _, _, done in state['segments'])
+        start_time = time.monotonic()
+        meter = _Meter(start_time)
+
+        # Datei in voller Länge anlegen (sparse), Segmente schreiben an ihre Position
+        with open(filename, 'r+b' if os.path.exists(filename) else 'wb') as f:
+            if os.path.getsize(filename) < state['length']:
+                f.truncate(state['length'])
+        self._save_state(state, filename)
+
+        lock = threading.Lock()
+        last_save = [time.monotonic()]
+        errors = []
+        ignored = threading.Event()
+
+        def fetch(segment):
+            start, end, done = segment
+            if start + done > end:
+                return
+            try:
+                headers = {'Range': f'bytes={start + done}-{end}'}
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    result['status'] = response.status_code
+                    if response.status_code != 206:
+                        response.raise_for_status()
+                        ignored.set()
+                        raise requests.RequestException(f"Server ignored range request ({response.status_code})")
+                    with open(filename, 'r+b', buffering=0) as f:
+                        f.seek(start + done)
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            chunk = chunk[:end - start - segment[2] + 1]
+                            f.write(chunk)
+                            meter.add(len(chunk))
+                            if self.bucket:
+                                self.bucket.consume(len(chunk))
+                            with lock:
+                                segment[2] += len(chunk)
+                                result['bytes'] += len(chunk)
+                                if time.monotonic() - last_save[0] > 1:
+                                    self._save_state(state, filename)
+                                    last_save[0] = time.monotonic()
+                            if start + segment[2] > end:
+                                break
+            except (requests.RequestException, OSError) as e:
+                with lock:
+                    errors.append(str(e))
+
+        threads = [threading.Thread(target=fetch, args=(segment,)) for segment in state['segments']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if ignored.is_set():
+            # der Server liefert keine Bereiche mehr: die sparse Datei ist nicht fortsetzbar
+            for path in [self.state_path(filename), filename]:
+                if os.path.exists(path):
+                    os.remove(path)
+            return None
+
+        result['duration'] = time.monotonic() - start_time
+        meter.finish(result)
+        missing = sum(end - start + 1 - done for start, end, done in state['segments'])
+        result['success'] = missing == 0
+        if result['success']:
+            os.remove(self.state_path(filename))
+        else:
+            self._save_state(state, filename)
+            result['error'] = errors[0] if errors else f"Incomplete download: {missing} bytes missing"
+        return result
+
+    def race(self, urls, probe_bytes=1 << 20):
+        """
+        Lädt von jeder URL parallel die ersten probe_bytes und gibt den Index der schnellsten
+        zurück (None, wenn keine antwortet). Die übrigen Anfragen werden abgebrochen, sobald
+        ein Gewinner feststeht.
+        """
+        finished = threading.Event()
+        winner = []
+        lock = threading.Lock()
+
+        def probe(index, url):
+            try:
+                headers = {'Range': f'bytes=0-{probe_bytes - 1}'}
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    received = 0
+                    for chunk in response.iter_content(chunk_size=min(self.chunk_size, probe_bytes)):
+                        received += len(chunk)
+                        if finished.is_set() or received >= probe_bytes:
+                            break
+                if not finished.is_set():
+                    with lock:
+                        if not winner:
+                            winner.append(index)
+                            finished.set()
+            except requests.RequestException:
+                pass
+
+        # nicht auf die langsameren Anfragen warten, sie beenden sich selbst
+        threads = [threading.Thread(target=probe, args=(index, url), daemon=True) for index, url in enumerate(urls)]
+        for thread in threads:
+            thread.start()
+        while not finished.wait(0.05) and any(thread.is_alive() for thread in threads):
+            pass
+        return winner[0] if winner else None
+
+    def _download_stream(self, url, filename):
+        result = _new_result(url, filename)
+        offset = os.path.getsize(filename) if os.path.exists(filename) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        start = time.monotonic()
+        meter = _Meter(start)
+
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                result['status'] = response.status_code
+
+                if response.status_code == 416 and offset:
+                    # Datei ist bereits vollständig (oder größer als die Quelle)
+                    result['total'] = _content_range_total(response.headers.get('Content-Range'))
+                    result['success'] = result['total'] == offset
+                    if not result['success']:
+                        result['error'] = f"Local file ({offset} bytes) does not match remote size ({result['total']} bytes)"
+                    elif self.hash_algorithm:
+                        result['hash'] = f'{self.hash_algorithm}:{self._hash_prefix(filename, offset).hexdigest()}'
+                    return result
+
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    mode = 'ab'
+                    result['resumed'] = offset
+                    result['total'] = _content_range_total(response.headers.get('Content-Range'))
+                else:
+                    # Server ignoriert Range: von vorne beginnen
+                    mode = 'wb'
+                    offset = 0
+                    length = response.headers.get('Content-Length')
+                    result['total'] = int(length) if length and length.isdigit() else None
+
+                digest = None
+                if self.hash_algorithm:
+                    digest = self._hash_prefix(filename, offset) if offset else hashlib.new(self.hash_algorithm)
+
+                with open(filename, mode, buffering=self.chunk_size) as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        meter.add(len(chunk))
+                        result['bytes'] += len(chunk)
+                        if digest:
+                            digest.update(chunk)
+                        if self.bucket:
+                            self.bucket.consume(len(chunk))
+
+                received = offset + result['bytes']
+                result['success'] = result['total'] is None or received == result['total']
+                if not result['success']:
+                    result['error'] = f"Incomplete download: {received} of {result['total']} bytes"
+                elif digest:
+                    result['hash'] = f'{self.hash_algorithm}:{digest.hexdigest()}'
+
+        except (requests.RequestException, OSError) as e:
+            result['error'] = str(e)
+        finally:
+            result['duration'] = time.monotonic() - start
+            meter.finish(result)
+
+        return result
+
+class WgetDownloader:
+    """
+    Download über ein externes wget (optional, benötigt das Programm im PATH).
+    limit_rate begrenzt jeden wget-Prozess einzeln (Bytes pro Sekunde).
+    """
+    def __init__(self, timeout=3, limit_rate=0):
+        self.timeout = timeout
+        self.limit_rate = int(limit_rate or 0)
+
+    def download(self, url, filename):
+        result = _new_result(url, filename)
+        offset = os.path.getsize(filename) if os.path.exists(filename) else 0
+        start = time.monotonic()
+
+        try:
+            CMD=["wget", f"--timeout={self.timeout}" ,"-c" ,"-O", filename, url]
+            if self.limit_rate > 0:
+                CMD.insert(1, f"--limit-rate={self.limit_rate}")
+            process = subprocess.run(CMD,
+                     stdout=subprocess.PIPE,
+                     stderr=subprocess.STDOUT)
+
+            result['success'] = process.returncode==0
+            if not result['success']:
+                lines = process.stdout.decode(errors='replace').strip().splitlines()
+                result['error'] = lines[-1] if lines else f"wget exited with {process.returncode}"
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            result['duration'] = time.monotonic() - start
+
+        size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        result['resumed'] = offset if size >= offset else 0
+        result['bytes'] = size - result['resumed']
+        return result
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+offline import of the MediathekView Filmliste
+"""
+import base64
+import hashlib
+import json
+import lzma
+from datetime import datetime, timezone
+
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+COLUMNS = [
+            "Sender",
+            "Thema",
+            "Titel",
+            "Datum",
+            "Zeit",
+            "Dauer",
+            "Größe [MB]",
+            "Beschreibung",
+            "Url",
+            "Website",
+            "Url Untertitel",
+            "Url RTMP",
+            "Url Klein",
+            "Url RTMP Klein",
+            "Url HD",
+            "Url RTMP HD",
+            "DatumL",
+            "Url History",
+            "Geo",
+            "neu",
+            ]
+
+def _open_text(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(XZ_MAGIC))
+    if magic == XZ_MAGIC:
+        return lzma.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def _seconds(duration):
+    """
+    'HH:MM:SS' -> Sekunden
+    """
+    try:
+        hours, minutes, seconds = [int(k) for k in duration.split(':')]
+        return hours * 3600 + minutes * 60 + seconds
+    except (AttributeError, ValueError):
+        return None
+
+def _expand_url(url, relative):
+    """
+    Die Filmliste speichert 'Url Klein' und 'Url HD' relativ zu 'Url' als '<präfixlänge>|<rest>'.
+    """
+    if not relative:
+        return None
+    prefix, sep, rest = relative.partition('|')
+    if sep and prefix.isdigit():
+        return url[:int(prefix)] + rest
+    return relative
+
+def _compress_url(url, variant):
+    if not variant:
+        return ''
+    prefix = 0
+    while prefix < min(len(url), len(variant)) and url[prefix] == variant[prefix]:
+        prefix += 1
+    return f'{prefix}|{variant[prefix:]}'
+
+def source_id(channel, topic, title, timestamp, url_video):
+    """
+    Lokal abgeleitete, stabile ID für Einträge der Filmliste (gleiches Format wie die IDs der API).
+    """
+    key = '|'.join(str(k or '') for k in [channel, topic, title, timestamp, url_video])
+    return base64.b64encode(hashlib.sha256(key.encode('utf-8')).digest()).decode('ascii')
+
+class FilmlisteReader:
+    """
+    Liest eine (optional xz-komprimierte) Filmliste als Strom von Datensätzen im Format der API.
+    Der Speicherbedarf ist auf einen Leseblock und einen Eintrag begrenzt.
+    """
+    def __init__(self, path, chunk_size=1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.created = None
+
+    def _entries(self, stream):
+        """
+        Zerlegt das Objekt '{"Filmliste": [...], "X": [...], ...}' in (Schlüssel, Liste)-Paare.
+        Ein normales json.load geht nicht, da die Schlüssel mehrfach vorkommen.
+        """
+        decoder = json.JSONDecoder()
+        buf, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = stream.read(self.chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,{':
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                fill()
+                continue
+            if buf[pos] == '}':
+                return
+
+            try:
+                key, end = decoder.raw_decode(buf, pos)
+                while end < len(buf) and buf[end] in ' \t\r\n:':
+                    end += 1
+                value, end = decoder.raw_decode(buf, end)
+            except ValueError:
+                # Eintrag noch nicht vollständig im Puffer
+                if eof:
+                    raise ValueError(f"Truncated or invalid filmliste: {self.path}")
+                fill()
+                continue
+
+            pos = end
+            yield key, value
+
+    @staticmethod
+    def _parse_created(header):
+        # ["<lokal>", "<UTC>", version, ...], Datum als "dd.mm.yyyy, HH:MM"
+        try:
+            created = datetime.strptime(header[1], "%d.%m.%Y, %H:%M").replace(tzinfo=timezone.utc)
+            return int(created.timestamp())
+        except (IndexError, TypeError, ValueError):
+            return None
+
+    def __iter__(self):
+        columns = COLUMNS
+        header_seen = False
+        channel, topic = '', ''
+
+        with _open_text(self.path) as stream:
+            for key, row in self._entries(stream):
+                if key == 'Filmliste':
+                    if not header_seen:
+                        self.created = self._parse_created(row)
+                        header_seen = True
+                    else:
+                        columns = row
+                    continue
+
+                field = dict(zip(columns, row)).get
+
+                # leere Felder für Sender und Thema bedeuten: wie im vorherigen Eintrag
+                channel = field('Sender', '') or channel
+                topic = field('Thema', '') or topic
+                url_video = field('Url', '')
+                timestamp = int(field('DatumL', '')) if str(field('DatumL', '')).isdigit() else None
+
+                try:
+                    size = int(float(field('Größe [MB]', '')) * 1024 * 1024)
+                except ValueError:
+                    size = None
+
+                yield {
+                    'id': source_id(channel, topic, field('Titel', ''), timestamp, url_video),
+                    'channel': channel,
+                    'topic': topic,
+                    'title': field('Titel', ''),
+                    'description': field('Beschreibung', ''),
+                    'timestamp': timestamp,
+                    'duration': _seconds(field('Dauer', '')),
+                    'size': size,
+                    'url_website': field('Website', '') or None,
+                    'url_subtitle': field('Url Untertitel', '') or None,
+                    'url_video': url_video or None,
+                    'url_video_low': _expand_url(url_video, field('Url Klein', '')),
+                    'url_video_hd': _expand_url(url_video, field('Url HD', '')),
+                    'filmlisteTimestamp': self.created,
+                }
+
+class FilmlisteImporter:
+    """
+    Importiert eine lokale Filmliste blockweise über DataBaseManager.save_sources.
+
+    Die Filmliste hat keine IDs der API. Ist eine Quelle mit derselben Video-URL schon
+    gespeichert (z.B. aus der API), wird deren ID übernommen statt einer zweiten Zeile.
+    """
+    def __init__(self, db, batch_size=5000):
+        self.db = db
+        self.batch_size = batch_size
+
+    def run(self, path):
+        counts = {'inserted': 0, 'updated': 0}
+        batch = []
+
+        def flush():
+            known = self.db.get_source_ids_by_url([record['url_video'] for record in batch])
+            for record in batch:
+                record['id'] = known.get(record['url_video'], record['id'])
+            result = self.db.save_sources(batch)
+            for key in counts:
+                counts[key] += result[key]
+            batch.clear()
+
+        print(f"Importing filmliste: {path}")
+        for record in FilmlisteReader(path):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                flush()
+        if batch:
+            flush()
+
+        print(f"Filmliste imported: {counts['inserted']} new, {counts['updated']} updated sources")
+        return counts
+
+def write_filmliste(path, records, created=None):
+    """
+    Schreibt Datensätze im Format der API als Filmliste (xz-komprimiert, wenn path auf .xz endet).
+    Gedacht für lokal erzeugte Testdateien.
+    """
+    created = created or datetime.now(timezone.utc)
+    header = [created.astimezone().strftime("%d.%m.%Y, %H:%M"), created.astimezone(timezone.utc).strftime("%d.%m.%Y, %H:%M"), "3", "mdl", ""]
+
+    opener = lzma.open if path.endswith('.xz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        f.write('{"Filmliste":' + json.dumps(header, ensure_ascii=False))
+        f.write(',"Filmliste":' + json.dumps(COLUMNS, ensure_ascii=False))
+
+        previous = (None, None)
+        for record in records:
+            timestamp = record.get('timestamp')
+            dt = datetime.fromtimestamp(int(timestamp)) if timestamp else None
+            duration = int(record.get('duration') or 0)
+            url_video = record.get('url_video') or ''
+            row = {
+                "Sender": '' if record.get('channel') == previous[0] else record.get('channel', ''),
+                "Thema": '' if (record.get('channel'), record.get('topic')) == previous else record.get('topic', ''),
+                "Titel": record.get('title', ''),
+                "Datum": dt.strftime("%d.%m.%Y") if dt else '',
+                "Zeit": dt.strftime("%H:%M:%S") if dt else '',
+                "Dauer": f"{duration // 3600:02d}:{duration // 60 % 60:02d}:{duration % 60:02d}",
+                "Größe [MB]": str(int((record.get('size') or 0) / 1024 / 1024)),
+                "Beschreibung": record.get('description', ''),
+                "Url": url_video,
+                "Website": record.get('url_website') or '',
+                "Url Untertitel": record.get('url_subtitle') or '',
+                "Url Klein": _compress_url(url_video, record.get('url_video_low')),
+                "Url HD": _compress_url(url_video, record.get('url_video_hd')),
+                "DatumL": str(int(timestamp)) if timestamp else '',
+            }
+            previous = (record.get('channel'), record.get('topic'))
+            f.write(',"X":' + json.dumps([row.get(name, '') for name in COLUMNS], ensure_ascii=False))
+        f.write('}')
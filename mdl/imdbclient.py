@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rate limited IMDB client with adaptive concurrency
+"""
+import threading
+import time
+import requests
+
+# import modules
+modules = [
+    "mdl.scheduler import TokenBucket",
+]
+
+for module in modules:
+    try:
+        exec(f"from {module}")
+    except:
+        exec(f"from {module.split('.')[-1]}")
+
+##############
+
+# Antworten, bei denen IMDB drosselt oder gerade nicht kann
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+class ImdbRetryableError(requests.RequestException):
+    """
+    Die Suche ist an Drosselung oder Netzwerkfehlern gescheitert und soll später wiederholt
+    werden. Sie ist kein endgültiges 'nicht gefunden'.
+    """
+    def __init__(self, message, retry_after=None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.retry_after = retry_after
+
+class AdaptiveImdbClient:
+    """
+    Hülle um PyMovieDb.IMDB: eine Parallelität, die AIMD-artig angepasst wird, und optional
+    höchstens `rate` HTTP-Anfragen pro Sekunde (TokenBucket, 0 = unbegrenzt; get_by_name kostet
+    zwei Anfragen, Suche und Titelseite). Jede schnelle Antwort erhöht das Limit um
+    1/limit (etwa +1 pro Runde), Drosselung (429/503) oder Antwortzeiten über `latency` halbieren
+    es, höchstens einmal pro `cooldown` Sekunden.
+
+    PyMovieDb meldet gedrosselte Anfragen als 'nicht gefunden' und fängt dabei jede Ausnahme
+    der Titelseite ab. Deshalb merkt sich ein Hook an der Session die Statuscodes jeder Antwort
+    pro Thread; hat eine Anfrage eine Antwort mit RETRYABLE_STATUS gesehen, wird ihr Ergebnis
+    verworfen und als ImdbRetryableError behandelt.
+    """
+    def __init__(self, imdb, rate=0, concurrency=10, min_concurrency=1, latency=5.0, retries=3, backoff=2.0, cooldown=2.0):
+        self.imdb = imdb
+        self.bucket = TokenBucket(rate)
+        self.max_concurrency = max(int(concurrency), 1)
+        self.min_concurrency = max(min(int(min_concurrency), self.max_concurrency), 1)
+        self.limit = float(self.max_concurrency)
+        self.latency = latency
+        self.retries = retries
+        self.backoff = backoff
+        self.cooldown = cooldown
+
+        self.active = 0
+        self.paused_until = 0.0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+        self.local = threading.local()
+
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+        self.imdb.session.hooks['response'].append(self._check_response)
+
+    def _check_response(self, response, *args, **kwargs):
+        # jede HTTP-Anfrage kostet ein Token (der Bucket erlaubt Schulden, gewartet wird danach)
+        self.bucket.consume(1)
+        status = getattr(self.local, 'status', None)
+        if status is not None:
+            status.append(response.status_code)
+        if response.status_code in RETRYABLE_STATUS:
+            retry_after = response.headers.get('Retry-After', '')
+            error = ImdbRetryableError(
+                f"IMDB answered {response.status_code} for {response.url}",
+                retry_after=float(retry_after) if retry_after.isdigit() else None,
+                response=response,
+            )
+            # PyMovieDb.IMDB.get() verschluckt die Ausnahme, _call() prüft deshalb diesen Wert
+            self.local.error = error
+            # der Body wird nach der Ausnahme nicht mehr gelesen: Verbindung an den Pool zurückgeben
+            response.close()
+            raise error
+
+    def last_status(self):
+        """
+        Statuscode der letzten Antwort, die die letzte Anfrage dieses Threads erhalten hat,
+        oder None, wenn keine Antwort kam.
+        """
+        status = getattr(self.local, 'status', None)
+        return status[-1] if status else None
+
+    def _acquire(self):
+        with self.condition:
+            while self.active >= int(self.limit) or time.monotonic() < self.paused_until:
+                self.condition.wait(timeout=max(self.paused_until - time.monotonic(), 0.1))
+            self.active += 1
+
+    def _release(self, elapsed=None, error=None):
+        with self.condition:
+            self.active -= 1
+            now = time.monotonic()
+            if error is not None or (elapsed is not None and elapsed > self.latency):
+                if now - self.decreased >= self.cooldown:
+                    self.limit = max(self.limit / 2, self.min_concurrency)
+                    self.decreased = now
+                if error is not None and error.retry_after:
+                    self.paused_until = max(self.paused_until, now + error.retry_after)
+            else:
+                self.limit = min(self.limit + 1 / self.limit, self.max_concurrency)
+            self.condition.notify_all()
+
+    def _call(self, function, *args, **kwargs):
+        """
+        Führt eine Anfrage über das Limit aus und wiederholt sie bei Drosselung mit
+        exponentiell wachsender Pause.
+
+        :raises ImdbRetryableError: wenn alle Versuche gedrosselt wurden oder fehlschlugen
+        """
+        for attempt in range(self.retries + 1):
+            self._acquire()
+            start = time.monotonic()
+            error = None
+            self.local.status = []
+            self.local.error = None
+            # der Platz wird auf jedem Weg freigegeben, auch bei unerwarteten Ausnahmen
+            try:
+                with self.condition:
+                    self.requests += 1
+                result = function(*args, **kwargs)
+                if self.local.error is not None:
+                    # gedrosselt, auch wenn PyMovieDb daraus 'nicht gefunden' gemacht hat
+                    raise self.local.error
+                return result
+            except requests.RequestException as e:
+                error = e if isinstance(e, ImdbRetryableError) else ImdbRetryableError(str(e))
+                with self.condition:
+                    self.throttled += 1
+            finally:
+                self._release(elapsed=time.monotonic() - start, error=error)
+            if attempt == self.retries:
+                with self.condition:
+                    self.failed += 1
+                raise error
+            time.sleep(error.retry_after or self.backoff * 2 ** attempt)
+
+    def get_by_name(self, name, year=None, tv=False):
+        return self._call(self.imdb.get_by_name, name, year=year, tv=tv)
+
+    def get_by_id(self, file_id):
+        return self._call(self.imdb.get_by_id, file_id)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'failed': self.failed,
+            'concurrency': int(self.limit),
+        }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+offline import of the IMDB datasets (title.basics.tsv.gz, title.ratings.tsv.gz)
+"""
+import gzip
+import os
+
+# import modules
+modules = [
+    "mdl.mdldb import IMDBTitle, IMDBRating, IMDB_DATASET_TYPES, normalize_title",
+]
+
+for module in modules:
+    try:
+        exec(f"from {module}")
+    except:
+        exec(f"from {module.split('.')[-1]}")
+
+##############
+
+BASICS = 'title.basics.tsv.gz'
+RATINGS = 'title.ratings.tsv.gz'
+
+# nur Filme und Serien werden importiert, keine Episoden, Kurzfilme, Spiele, ...
+TITLE_TYPES = {k for types in IMDB_DATASET_TYPES.values() for k in types}
+
+def _value(field):
+    # fehlende Werte stehen im Datensatz als '\N'
+    return None if field == '\\N' else field
+
+def _int(field):
+    try:
+        return int(field)
+    except (TypeError, ValueError):
+        return None
+
+def read_tsv(path):
+    """
+    Liest eine (gzip-komprimierte) TSV-Datei des IMDB-Datensatzes zeilenweise als Dictionaries.
+    Die Dateien sind nicht gequotet, daher wird nur an Tabulatoren getrennt.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='\n') as f:
+        columns = f.readline().rstrip('\n').split('\t')
+        for line in f:
+            yield dict(zip(columns, [_value(k) for k in line.rstrip('\n').split('\t')]))
+
+def read_titles(path):
+    for row in read_tsv(path):
+        if row.get('titleType') not in TITLE_TYPES or row.get('isAdult') == '1':
+            continue
+        primary = row.get('primaryTitle') or ''
+        original = row.get('originalTitle') or primary
+        yield {
+            'tconst': row['tconst'],
+            'title_type': row['titleType'],
+            'primary_title': primary,
+            'original_title': original,
+            'primary_norm': normalize_title(primary),
+            'original_norm': normalize_title(original),
+            'start_year': _int(row.get('startYear')),
+            'genres': row.get('genres'),
+        }
+
+def read_ratings(path):
+    for row in read_tsv(path):
+        try:
+            rating = float(row.get('averageRating'))
+        except (TypeError, ValueError):
+            rating = None
+        yield {
+            'tconst': row['tconst'],
+            'average_rating': rating,
+            'num_votes': _int(row.get('numVotes')),
+        }
+
+class ImdbDatasetImporter:
+    """
+    Importiert die IMDB-Datensätze (https://datasets.imdbws.com/) aus einem lokalen Verzeichnis
+    als Strom in die Tabellen imdb_title und imdb_rating. Eine Datei wird nur neu eingelesen,
+    wenn sich Größe oder Änderungszeit geändert haben.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def _import(self, path, model, reader):
+        stat = os.stat(path)
+        counts = {}
+
+        def run():
+            print(f"Importing IMDB dataset: {path}")
+            counts[model.__tablename__] = self.db.replace_imdb_dataset(model, reader(path))
+            print(f"IMDB dataset imported: {counts[model.__tablename__]} rows into '{model.__tablename__}'")
+
+        self.db._run_once(f"imdb_dataset:{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}", run)
+        return counts
+
+    def run(self, directory):
+        counts = {}
+        for name, model, reader in [(BASICS, IMDBTitle, read_titles), (RATINGS, IMDBRating, read_ratings)]:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                print(f"IMDB dataset file not found: {path}")
+                continue
+            counts.update(self._import(path, model, reader))
+        return counts
@@ -4,12 +4,13 @@
 DOWNLOAD ALL THE MOVIES
 """
 import argparse
+import contextlib
 import pandas as pd
 import os
+import json
 import shutil
 import requests
 from bs4 import BeautifulSoup
-import subprocess
 import datetime
 import re
 from slugify import slugify
@@ -18,9 +19,19 @@ from PyMovieDb import IMDB
 
 # import modules
 modules = [
-    "mdl.mdldb import DataBaseManager",
+    "mdl.mdldb import DataBaseManager, QUALITY_FALLBACK, QUALITY_RANK",
     "mdl.updater import *",
     "mdl.thworker import *",
+    "mdl.pager import *",
+    "mdl.filmliste import FilmlisteImporter",
+    "mdl.imdbdataset import ImdbDatasetImporter",
+    "mdl.exclusion import *",
+    "mdl.fetcher import *",
+    "mdl.scheduler import *",
+    "mdl.planner import *",
+    "mdl.verify import *",
+    "mdl.prefetch import HeadPrefetcher",
+    "mdl.metrics import DownloadMetrics",
 ]
 
 for module in modules:
@@ -43,6 +54,11 @@ pd.set_option('display.max_columns', None)
 pd.set_option('display.width', None)
 pd.set_option('display.max_colwidth', None)
 
+SERIES_URL = "https://www.zdf.de/serien"
+
+# do not retry these on a later run
+PERMANENT_HTTP_ERRORS = (404, 410)
+
 class mdownloader:
     def __init__(self, **kwargs):
         self.args = {                   
@@ -69,6 +85,26 @@ class mdownloader:
                     'year' : 2000,
                     'imdb_reset' : False,
                     'nfo' : False,
+                    'page_size' : 50,
+                    'page_concurrency' : 4,
+                    'delta' : False,
+                    'filmliste' : None,
+                    'imdb_dataset' : None,
+                    'imdb_rate' : 0,
+                    'downloader' : 'native',
+                    'timeout' : 30,
+                    'jobs' : 1,
+                    'per_host' : 2,
+                    'bandwidth' : 0,
+                    'segments' : 1,
+                    'plan' : 'order',
+                    'hash' : None,
+                    'race' : False,
+                    'head' : False,
+                    'head_ttl' : 24,
+                    'metrics_dir' : None,
+                    'api_url' : API_URL,
+                    'series_url' : SERIES_URL,
                     }
         self.args.update(kwargs)
         self.args['series_filter'] = [k.strip() for k in self.args['series_filter'].split(';')]
@@ -83,9 +119,18 @@ class mdownloader:
         
         self._reset_dataframe()
         
-        self.db = DataBaseManager(configdir=self.args['configdir'])
+        self.db = DataBaseManager(configdir=self.args['configdir'], imdb_rate=self.args['imdb_rate'])
+
+        bandwidth = float(self.args['bandwidth'])*1024*1024
+        if self.args['downloader'] == 'wget':
+            self.fetcher = WgetDownloader(timeout=self.args['timeout'], limit_rate=bandwidth/max(self.args['jobs'], 1))
+        else:
+            self.fetcher = HttpDownloader(timeout=self.args['timeout'], pool_size=max(self.args['jobs']*self.args['segments'], 10), bucket=TokenBucket(bandwidth), segments=self.args['segments'], hash_algorithm=self.args['hash'])
         
         self.print = ['title', 'channel']
+
+        # metrics of all downloads of this run (series_downloader calls download_movies once per series)
+        self.metrics = DownloadMetrics()
         
         if os.path.exists(self.args['logfile']) & ~self.args['q']:
             with open(self.args['logfile']) as f:
@@ -96,6 +141,10 @@ class mdownloader:
             os.remove(self.args['logfile'])
 
         if (self.args['imdb_reset'] == True): self.db._reset_imdb()
+
+        if self.args['filmliste']: FilmlisteImporter(self.db).run(os.path.abspath(self.args['filmliste']))
+
+        if self.args['imdb_dataset']: ImdbDatasetImporter(self.db).run(os.path.abspath(self.args['imdb_dataset']))
         
         if self.args['imdb']!=None: self.args['search']='Spielfilm,Kino Film,Filme im Ersten,Filme'
 
@@ -109,6 +158,8 @@ class mdownloader:
 
         if self.args['series']: self.series_downloader()
 
+        if self.args['metrics_dir']: self.metrics.export(os.path.abspath(self.args['metrics_dir']))
+
     def _reset_dataframe(self):
         self.DF_links = pd.DataFrame()
         
@@ -134,7 +185,7 @@ class mdownloader:
             # URL der Webseite, die geparst werden soll
             url = row['website']
             
-            if url.startswith("https://www.zdf.de/serien"):
+            if isinstance(url, str) and url.startswith(self.args['series_url']):
                 # HTML-Code von der URL abrufen
                 response = requests.get(url)
                 html_code = response.text
@@ -227,65 +278,96 @@ class mdownloader:
         
         return modified_df
     
+    def _ingest_pages(self, pages, mark=None, counts=None, batch_size=500):
+        """
+        Schreibt die Seiten während des Pagings in die Datenbank (eine Transaktion je batch_size
+        Quellen) und gibt nur (ID, Zeitstempel) weiter. Der Speicherbedarf ist so durch
+        batch_size begrenzt statt durch die Größe des Suchergebnisses.
+
+        Im Delta-Modus endet der Strom an der ersten Seite, die nur bekannte Quellen enthält,
+        die nicht neuer als die Hochwassermarke sind.
+
+        :param counts: Dict, in dem die Anzahl neuer ('inserted') und aktualisierter ('updated')
+                       Quellen aufsummiert wird
+        """
+        counts = counts if counts is not None else {'inserted': 0, 'updated': 0}
+        batch = []
+
+        def flush():
+            result = self.db.save_sources(batch)
+            for key in counts:
+                counts[key] += result[key]
+            batch.clear()
+
+        for page in pages:
+            if mark is not None:
+                known = self.db.get_known_source_ids([k['id'] for k in page])
+                if len(known) == len(page) and all(int(k.get('timestamp') or 0) <= mark['timestamp'] for k in page):
+                    break
+            batch.extend(page)
+            if len(batch) >= batch_size:
+                flush()
+            for k in page:
+                yield k['id'], int(k.get('timestamp') or 0)
+        if batch:
+            flush()
+
+    def _query_sources(self, QUERIES):
+        """
+        Fragt die API ab, speichert die Ergebnisse seitenweise und gibt die IDs der gefundenen Quellen zurück.
+
+        Im Delta-Modus wird das Paging beendet, sobald eine Seite nur noch bekannte Quellen
+        enthält, die nicht neuer als die Hochwassermarke der Suchanfrage sind. Die restlichen
+        Quellen der Suchanfrage kommen dann aus der lokalen Datenbank.
+        """
+        query_key = json.dumps(QUERIES, sort_keys=True, ensure_ascii=False)
+        mark = self.db.get_sync_state(query_key) if self.args['delta'] else None
+
+        pager = QueryPager(QUERIES, page_size=self.args['page_size'], concurrency=self.args['page_concurrency'], url=self.args['api_url'], initial=1 if mark else None)
+        source_ids, newest, counts = [], None, {'inserted': 0, 'updated': 0}
+        for source_id, timestamp in self._ingest_pages(pager.pages(), mark=mark, counts=counts):
+            source_ids.append(source_id)
+            if newest is None or timestamp > newest['timestamp']:
+                newest = {'timestamp': timestamp, 'id': source_id}
+        print(f"API sources saved: {counts['inserted']} new, {counts['updated']} updated sources")
+
+        # die Marke nur nach vollständigem Paging verschieben (leere Seite oder Grenze im Delta-Modus),
+        # nach einem Fehler bleibt die alte Marke stehen und der nächste Lauf holt den Rest
+        if pager.error is not None:
+            print("Paging incomplete, keeping the previous delta sync mark")
+            newest = None
+        self.db.update_sync_state(
+            query_key,
+            newest_timestamp=newest['timestamp'] if newest else None,
+            newest_id=newest['id'] if newest else None,
+            source_ids=source_ids,
+        )
+
+        if mark is not None:
+            print(f"Delta sync: {len(source_ids)} new or changed sources from {pager.requests} API requests")
+            source_ids = list(dict.fromkeys(source_ids + self.db.get_query_source_ids(query_key)))
+
+        return source_ids
+
     def get_links(self):
         self._reset_dataframe()
+
+        # useless sources are excluded in the database queries already
+        exclude = ExclusionMatcher(self.args['exclude'].split(',') + EXCLUDED_TAGS)
         
         if self.args.get('no_query', False)==False:
             QUERIES = [{'fields': ['title', 'topic'],'query': k} for k in self.args['search'].split(',')]
             if self.args['channel'].split(',') != ['']: QUERIES += [{'fields': ['channel'],'query': k} for k in self.args['channel'].split(',')]
-            DF_links = pd.DataFrame()
-            skip = 0
-            while True:
-                data =      {  
-                            'queries': QUERIES,
-                            'sortBy': 'timestamp',
-                            'sortOrder': 'desc',
-                            'future': 'true',
-                            'offset': skip,
-                            'size': 50,
-                            'duration_min': 20,
-                            'duration_max': 10000,
-                            }
-                try:
-                    DF_tmp = pd.DataFrame(requests.post('https://mediathekviewweb.de/api/query',  json=data, headers={'content-type': 'text/plain'}).json()['result']['results'])
-                    DF_links = pd.concat([DF_links, DF_tmp], ignore_index=True)
-                    skip+=50
-                    if len(DF_tmp)==0: break
-                except:
-                    break
-            
-            self.db.save_sources(DF_links.to_dict(orient='records'))
-        
-            try:
-                DF_links = pd.DataFrame(self.db.get_source_on_id(DF_links['id'].values, only_not_downloaded=(self.args['q']==False) and (not self.args['mark_undone']), quality=self.args['quality']))
-            except:
-                DF_links = pd.DataFrame()
-                
+            source_ids = self._query_sources(QUERIES)
         else:
-            try:
-                DF_links = pd.DataFrame(self.db.get_source_on_id(self.db.get_imdb_entry_over(score=self.args.get('imdb',7)), only_not_downloaded=(self.args['q']==False) and (not self.args['mark_undone']), quality=self.args['quality']))
-            except:
-                DF_links = pd.DataFrame()    
+            if self.args['imdb']!=None:
+                source_ids = self.db.get_imdb_entry_over(score=self.args.get('imdb',7))
+            else:
+                source_ids = self.db.search_sources(search=self.args['search'].split(','), channel=self.args['channel'].split(','), exclude=exclude)
+
+        DF_links = self.db.get_source_frame_on_id(source_ids, only_not_downloaded=(self.args['q']==False) and (not self.args['mark_undone']), quality=self.args['quality'], exclude=exclude, variants=True)
 
         if not DF_links.empty:    
-            #exclude useless sources
-            excluded_tags = [
-                            'Audiodeskription',
-                            '(ita)',
-                            '(Englisch)',
-                            '(Französisch)',
-                            '(dan)',
-                            'Hörfassung',
-                            '(Englische Originalfassung)',
-                            '(Originalversion)',
-                            'Originalversion',
-                            'Originalfassung',
-                            '(OV)',
-                            '(heb)',
-                            ]
-            for i in list(set(self.args['exclude'].split(',')) | set(excluded_tags)):
-                DF_links = DF_links[(~DF_links['title'].str.contains(i, regex=False))]
-            
             # cleanup titles
             DF_links['title'] = DF_links['title'].str.replace("/",' ')  
             
@@ -315,22 +397,81 @@ class mdownloader:
             
             if self.args['index']!=[]:
                 self.DF_links = self.DF_links[self.DF_links.index.isin(self.args['index'])]
+
+            if self.args['head']: self._prefetch_heads()
+
+    def _prefetch_heads(self):
+        """
+        HEAD prefetch of all candidate links: real sizes for planning, dead variants are removed,
+        sources without any live variant are dropped
+        """
+        prefetcher = HeadPrefetcher(self.db, ttl=datetime.timedelta(hours=self.args['head_ttl']), concurrency=self.args['threads'])
+        qualities = [q for q in QUALITY_FALLBACK.get(self.args['quality'], QUALITY_FALLBACK['M']) if f'link_{q}' in self.DF_links]
+        DF_links = self.DF_links
+
+        # first the selected quality, the other variants only where it is missing or dead
+        heads = prefetcher.lookup(DF_links['link'].tolist())
+        is_dead = lambda url: not isinstance(url, str) or not url or heads.get(url, {}).get('status') in PERMANENT_HTTP_ERRORS
+        dead = DF_links['link'].map(is_dead)
+        heads.update(prefetcher.lookup(DF_links.loc[dead, [f'link_{q}' for q in qualities]].values.ravel().tolist()))
+
+        alive, sizes = [], []
+        for i, row in DF_links.iterrows():
+            urls = [row['link']] + [row[f'link_{q}'] for q in qualities]
+            for q in qualities:
+                if is_dead(row[f'link_{q}']):
+                    DF_links.loc[i, f'link_{q}'] = None
+            live = [url for url in urls if not is_dead(url)]
+            alive.append(bool(live))
+            length = heads.get(live[0], {}).get('content_length') if live else None
+            sizes.append(length / (1024 * 1024) if length else row['size'])
+
+        DF_links['size'] = sizes
+        if not all(alive):
+            print(f"Dropping {alive.count(False)} sources with dead links")
+        self.DF_links = DF_links[alive].reset_index(drop=True)
+        print(f"HEAD prefetch: {prefetcher.requests} requests, {len(heads)} links known")
     
     def _update_imdb_info(self, DF_links):
         self.db._reparse_imdb_items()
         
         DF_imdb = DF_links[DF_links['imdb_parsed']==False][['id','p_title', 'p_year']]
-        DF_imdb = DF_imdb.rename(columns={'id':'source_id','p_title':'title','p_year':'year',})
-        
-        data = DF_imdb[~pd.isnull(DF_imdb['year'])].to_dict(orient='records')
-        if len(data)>0:
-            myworker = ThreadedWorker(data, self.db._update_imdb_info_entry, info='Getting metadata from IMDB (TAGGED)')
-            myworker.start_processing()
 
-        data = DF_imdb[pd.isnull(DF_imdb['year'])].to_dict(orient='records')
-        if len(data)>0:
-            myworker = ThreadedWorker(data, self.db._update_imdb_info_entry, info='Getting metadata from IMDB (UNTAGGED)')
-            myworker.start_processing()
+        # one IMDB lookup per normalized (title, year), the result is written to all sources of the group
+        groups = {}
+        for source_id, title, year in DF_imdb.itertuples(index=False):
+            try:
+                year = int(year)
+            except (TypeError, ValueError):
+                year = None
+            group = groups.setdefault(self.db._imdb_lookup_key(title, year), {'source_ids': [], 'title': title, 'year': year})
+            group['source_ids'].append(source_id)
+
+        titles = len(groups)
+        requests_before = self.db.imdb_requests
+
+        # local IMDB dataset first, the scraper only resolves what is left
+        if len(groups)>0 and self.db.has_imdb_dataset():
+            resolved = self.db.resolve_from_imdb_dataset(list(groups.values()))
+            print(f"IMDB dataset: {len(resolved)} of {len(groups)} titles matched locally")
+            groups = {key: group for key, group in groups.items() if key not in resolved}
+
+        with self.db.batched_writes():
+            data = [group for group in groups.values() if group['year'] is not None]
+            if len(data)>0:
+                myworker = ThreadedWorker(data, self.db.update_imdb_info_group, info='Getting metadata from IMDB (TAGGED)')
+                myworker.start_processing()
+
+            data = [group for group in groups.values() if group['year'] is None]
+            if len(data)>0:
+                myworker = ThreadedWorker(data, self.db.update_imdb_info_group, info='Getting metadata from IMDB (UNTAGGED)')
+                myworker.start_processing()
+
+        if len(DF_imdb)>0:
+            print(f"IMDB lookups: {len(DF_imdb)} sources grouped into {titles} titles, {self.db.imdb_requests - requests_before} IMDB requests")
+            stats = self.db.imdb_client.stats()
+            if stats['throttled']>0:
+                print(f"IMDB throttled {stats['throttled']} requests (concurrency now {stats['concurrency']}), {stats['failed']} titles are retried in the next run")
             
     def _get_download_filename_from_url(self, URL):
             parsed_url = urlparse(URL)
@@ -345,8 +486,12 @@ class mdownloader:
         for i in range(len(dirlist)):
             tmpdir = os.path.abspath(os.sep.join(dirlist[:i+1]))
             if not os.path.exists(tmpdir):
-                os.mkdir(tmpdir)
-                print('Create {:}'.format(tmpdir))
+                try:
+                    os.mkdir(tmpdir)
+                    print('Create {:}'.format(tmpdir))
+                except FileExistsError:
+                    # created by a parallel download job
+                    pass
     
     def get_info(self):
         self.get_links()
@@ -362,29 +507,16 @@ class mdownloader:
     def mark_as_undone(self):
         self.db.mark_as_not_downloaded(self.DF_links['id'].values)
 
-    def check_free_space(self):
-        """
-        return free disk space in GB
-        """
-        self.ensure_dir(self.args['download'])
-        disk = os.statvfs(self.args['download']+'/')
-        return float(disk.f_bsize*disk.f_bfree)/1024/1024/1024
-    
     def _wget(self, FILENAME, URL):
-        try:
-            CMD=["wget", "--timeout=3" ,"-c" ,"-O", FILENAME, URL]
-            print(f"Start downloading: {FILENAME}")
-            result = subprocess.run(CMD,
-                     stdout=subprocess.PIPE,
-                     stderr=subprocess.STDOUT)
-            
-            return result.returncode==0
-        except:
-            return False
+        print(f"Start downloading: {FILENAME}")
+        result = self.fetcher.download(URL, FILENAME)
+        if not result['success']:
+            print(f"Download failed ({result['status'] or 'no response'}): {result['error']}")
+        return result
 
-    def wget(self,row,TITLE):
+    def _download_paths(self, row, TITLE):
         """
-        download URL
+        return download directory, filename, target path and partial path of a source
         """
         URL = row['link']
         if self.args['file']:
@@ -401,53 +533,239 @@ class mdownloader:
         # setting paths
         DOWNLOAD_PATH_FILENAME = os.path.join(DOWNLOAD_BASEDIR, DOWNLOAD_FILENAME)
         PARTIAL_FILENAME = f'{DOWNLOAD_PATH_FILENAME}.partial'
+        return DOWNLOAD_BASEDIR, DOWNLOAD_FILENAME, DOWNLOAD_PATH_FILENAME, PARTIAL_FILENAME
+
+    def _discard_partial(self, PARTIAL_FILENAME):
+        for filename in [PARTIAL_FILENAME, f'{PARTIAL_FILENAME}.state']:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _variant_order(self, job, PARTIAL_FILENAME):
+        """
+        order of the quality variants to try: the variant of an existing partial file first,
+        otherwise the fallback order, optionally with the faster of the requested quality and the
+        next higher one in front (racing never picks a lower quality); a faster higher quality is
+        only taken if its real size still fits into the reserved disk space
+        """
+        variants = [tuple(k) for k in job.get('variants') or []] or [(job.get('quality') or self.args['quality'], job['url'])]
+        partial_quality = job.get('quality') or variants[0][0]
+        if bytes_on_disk(PARTIAL_FILENAME):
+            return sorted(variants, key=lambda k: k[0] != partial_quality)
+        candidates = [i for i, (quality, _) in enumerate(variants) if QUALITY_RANK.get(quality, 0) >= QUALITY_RANK.get(variants[0][0], 0)][:2]
+        if self.args['race'] and len(candidates) > 1 and hasattr(self.fetcher, 'race'):
+            winner = self.fetcher.race([variants[i][1] for i in candidates])
+            if winner:
+                winner = candidates[winner]
+                quality, url = variants[winner]
+                size = self.fetcher.content_length(url)
+                if size is None:
+                    print(f"Quality {quality} responded faster than {variants[0][0]}, but its size is unknown")
+                elif not self.planner.resize(job['source_id'], job, size):
+                    print(f"Quality {quality} responded faster than {variants[0][0]}, but does not fit into the free disk space")
+                else:
+                    print(f"Quality {quality} responded faster than {variants[0][0]}")
+                    self._update_job(job, size=size)
+                    variants.insert(0, variants.pop(winner))
+        return variants
+
+    def _resize_variant(self, job, quality, url):
+        """
+        move the disk space reservation of a job to a fallback variant before downloading it,
+        using its real size (an unknown size counts as 0, like in the plan); False if the
+        variant does not fit into the free disk space
+        """
+        content_length = getattr(self.fetcher, 'content_length', None)
+        size = content_length(url) if content_length else None
+        if not self.planner.resize(job['source_id'], job, size):
+            print(f"Quality {quality} does not fit into the free disk space, skipping")
+            return False
+        self._update_job(job, size=size)
+        return True
+
+    def wget(self, job):
+        """
+        download URL of a job, falling back to the other quality variants on errors;
+        the .partial file is kept on failure so that the next run resumes it
+        """
+        DOWNLOAD_PATH_FILENAME = os.path.join(job['basedir'], job['filename'])
+        PARTIAL_FILENAME = f'{DOWNLOAD_PATH_FILENAME}.partial'
         
         # ensure directory exists
         self.ensure_dir(os.path.dirname(DOWNLOAD_PATH_FILENAME))
         
-        # try downloading file
-        max_attempts, attempt, success = 3, 0, False
-        while attempt < max_attempts and not success:
-            success = self._wget(PARTIAL_FILENAME, URL)
-            attempt += 1
-            
-        # cleanup
-        if os.path.exists(PARTIAL_FILENAME):
+        variants = self._variant_order(job, PARTIAL_FILENAME)
+        partial_quality = job.get('quality') or variants[0][0]
+        success, results = False, []
+        for index, (quality, url) in enumerate(variants):
+            if quality != partial_quality and bytes_on_disk(PARTIAL_FILENAME):
+                # the partial file belongs to another variant
+                print(f"Switching to quality {quality}, discarding partial download of quality {partial_quality}")
+                self._discard_partial(PARTIAL_FILENAME)
+            # the reservation and job['size'] belong to the first variant
+            if index and not self._resize_variant(job, quality, url):
+                continue
+            partial_quality = job['quality'] = quality
+            self._update_job(job, quality=quality, url=url)
+
+            # try downloading file
+            max_attempts, attempt, result = 3, 0, None
+            while attempt < max_attempts and not success:
+                job['attempts'] = job.get('attempts', 0) + 1
+                self._update_job(job, state='running', attempts=job['attempts'])
+                result = self._wget(PARTIAL_FILENAME, url)
+                results.append(result)
+                success = result['success']
+                self._update_job(job, bytes_done=bytes_on_disk(PARTIAL_FILENAME), http_status=result['status'], last_error=result['error'])
+                attempt += 1
+                if result['status'] in PERMANENT_HTTP_ERRORS:
+                    break
+
             if success:
-                shutil.move(PARTIAL_FILENAME, DOWNLOAD_PATH_FILENAME)
-            else:
-                os.remove(PARTIAL_FILENAME)
-                
-        return success, DOWNLOAD_BASEDIR, DOWNLOAD_FILENAME
+                verification = verify_download(result, PARTIAL_FILENAME, expected_size=job.get('size'))
+                self._update_job(job, **verification)
+                if verification['verified']:
+                    break
+                # complete according to the server but broken: try the next variant
+                print(f"Verification failed: {verification['verify_error']}")
+                self._discard_partial(PARTIAL_FILENAME)
+                self._update_job(job, last_error=verification['verify_error'], bytes_done=0)
+                success = False
+            elif result['status'] not in PERMANENT_HTTP_ERRORS and bytes_on_disk(PARTIAL_FILENAME):
+                # keep the progress of this variant for the next run
+                break
+            
+        if success and os.path.exists(PARTIAL_FILENAME):
+            shutil.move(PARTIAL_FILENAME, DOWNLOAD_PATH_FILENAME)
+            print(f"Downloaded quality {job['quality']}: {DOWNLOAD_PATH_FILENAME}")
+
+        self._update_job(job, state='done' if success else 'failed')
+        self.metrics.record(results, source_id=job['source_id'], host=urlparse(results[-1]['url']).hostname if results else None, channel=job['meta'].get('channel'), quality=job.get('quality'))
+        return success
+
+    def _update_job(self, job, **values):
+        # quick mode does not persist the queue
+        if not self.args['q']:
+            self.db.update_download_job(job['source_id'], **values)
+
+    def _prepare_job(self, i, row, rating=None):
+        """
+        Titel, Staffel/Folge und Zielpfade eines Downloads bestimmen (läuft vor allen Transfers
+        im Hauptthread, damit der Platzbedarf geplant werden kann).
+        """
+        # parse season and episode from title
+        series_parse = self._extract_title_season_episode_dict(row['title'])
+        row['title'] = series_parse.get('title', row['title'])
+        if series_parse['season'] is not None and series_parse['episode'] is not None:
+            self.db.add_metadata([{'source_id': row['id'], 'season': series_parse['season'], 'episode': series_parse['episode']}])
+        
+        # parse season and episode from website
+        self.get_series_metadata_from_id([row['id']])
+        
+        # get parsed info
+        meta = self.db.get_metadata(row['id'])
+        
+        TITLE = slugify(row['title'], separator='_', lowercase=False)
+        if meta:
+            TITLE = os.path.join(f'Staffel {meta["season"]:d}',f'S{meta["season"]:02d}E{meta["episode"]:02d}_{TITLE}')
+
+        # quality variants in fallback order, the first available one names the file
+        variants = []
+        for quality in QUALITY_FALLBACK.get(self.args['quality'], QUALITY_FALLBACK['M']):
+            url = row.get(f'link_{quality}')
+            if isinstance(url, str) and url and url not in [k[1] for k in variants]:
+                variants.append([quality, url])
+        if variants:
+            row['link'] = variants[0][1]
+
+        DOWNLOAD_BASEDIR, DOWNLOAD_FILENAME, _, _ = self._download_paths(row, TITLE)
+        size = row['size']
+        
+        # everything needed later for the nfo file, NaN as None
+        nfo = {k: (None if pd.isna(row.get(k)) else row.get(k)) for k in ['title', 'p_title', 'description', 'p_year', 'imdb', 'p_land', 'channel']}
+        nfo['rating'] = None if rating is None or pd.isna(rating) else float(rating)
+        
+        return {
+                'source_id': row['id'],
+                'url': row['link'],
+                'basedir': DOWNLOAD_BASEDIR,
+                'filename': DOWNLOAD_FILENAME,
+                'size': None if pd.isna(size) else int(size * 1024 * 1024),
+                'meta': nfo,
+                'variants': variants,
+                }
+
+    def _plan_job(self, job):
+        """
+        Ergänzt einen Job (neu oder aus der Tabelle download_job) um die Angaben für Planung und Scheduler.
+        """
+        job['name'] = job['meta'].get('title') or job['filename']
+        job['host'] = urlparse(job['url'] or '').hostname
+        job['partial'] = f"{os.path.join(job['basedir'], job['filename'])}.partial"
+        job['rating'] = job['meta'].get('rating')
+        return job
+
+    def _download_job(self, job):
+        # the persistent queue is shared with other mdl processes: only download claimed jobs
+        lease = self.db.download_job_lease(job['source_id']) if not self.args['q'] else contextlib.nullcontext(True)
+        with lease as claimed:
+            if not claimed:
+                print(f"Already being downloaded by another process: {job['name']}")
+                return False
+
+            if not self.planner.reserve(job['source_id'], job):
+                print("No free disk space. Skip download.")
+                self._update_job(job, state='queued')
+                return False
+
+            try:
+                is_downloaded = self.wget(job)
+            finally:
+                self.planner.release(job['source_id'])
+
+        if not self.args['q'] and is_downloaded:
+            self.db.mark_as_downloaded([job['source_id']])
+            if (self.args['imdb']!=None) or (self.args['nfo']==True):
+                nfo_filename = job['filename'].replace('.mp4','')
+                self.create_movie_nfo(job['meta'], job['basedir'], filename=nfo_filename)
+        return is_downloaded
 
     def download_movies(self):
-        for i, row in self.DF_links.iterrows():
-            # parse season and episode from title
-            series_parse = self._extract_title_season_episode_dict(row['title'])
-            row['title'] = series_parse.get('title', row['title'])
-            if series_parse['season'] is not None and series_parse['episode'] is not None:
-                self.db.add_metadata([{'source_id': row['id'], 'season': series_parse['season'], 'episode': series_parse['episode']}])
-            
-            # parse season and episode from website
-            self.get_series_metadata_from_id([row['id']])
-            
-            # get parsed info
-            meta = self.db.get_metadata(row['id'])
-            
-            TITLE = slugify(row['title'], separator='_', lowercase=False)
-            if meta:
-                TITLE = os.path.join(f'Staffel {meta["season"]:d}',f'S{meta["season"]:02d}E{meta["episode"]:02d}_{TITLE}')
-
-            if (self.check_free_space() - self.DF_links.loc[i,'size'] / 1024) > float(self.args['free']):
-                is_downloaded, DOWNLOAD_BASEDIR, DOWNLOAD_FILENAME = self.wget(row, TITLE)
-
-                if not self.args['q'] and is_downloaded:
-                    self.db.mark_as_downloaded([self.DF_links.loc[i,'id']])
-                    if (self.args['imdb']!=None) or (self.args['nfo']==True):
-                        nfo_filename = DOWNLOAD_FILENAME.replace('.mp4','')
-                        self.create_movie_nfo(row, DOWNLOAD_BASEDIR, filename=nfo_filename)
+        ratings = {}
+        if self.args['plan'] == 'rating' and not self.DF_links.empty:
+            if 'rating' in self.DF_links:
+                ratings = dict(zip(self.DF_links.index, self.DF_links['rating']))
             else:
-                print("No free disk space. Skip download.")
+                imdb = self.db.get_ratings_for_imdb_ids(self.DF_links['imdb'].values, year=1)
+                ratings = {i: imdb.get(k, {}).get('rating') for i, k in self.DF_links['imdb'].items()}
+
+        jobs = [self._prepare_job(i, row, rating=ratings.get(i)) for i, row in self.DF_links.iterrows()]
+
+        if not self.args['q']:
+            # persistent queue: new jobs are added, unfinished jobs of earlier runs are resumed
+            self.db.enqueue_download_jobs(jobs, permanent=PERMANENT_HTTP_ERRORS)
+            resumed = self.db.resume_download_jobs(permanent=PERMANENT_HTTP_ERRORS)
+            jobs = self.db.get_download_jobs()
+            if resumed:
+                print(f"Resuming {resumed} unfinished downloads")
+
+        if not jobs:
+            return
+        jobs = [self._plan_job(job) for job in jobs]
+
+        self.ensure_dir(self.args['download'])
+        self.planner = SpacePlanner(self.args['download'], min_free=float(self.args['free'])*1024*1024*1024)
+        selected, skipped = self.planner.plan(jobs, strategy=self.args['plan'])
+        self.planner.print_plan(selected, skipped)
+        # skipped jobs only come back when a later search queues them again
+        if not self.args['q']: self.db.skip_download_jobs([job['source_id'] for job in skipped])
+
+        recorded = len(self.metrics.transfers)
+        scheduler = DownloadScheduler(jobs=self.args['jobs'], per_host=self.args['per_host'])
+        for job in selected:
+            scheduler.add(job['host'], self._download_job, job=job)
+        scheduler.run()
+
+        if not self.args['q']: self.db.save_download_metrics(self.metrics.transfers[recorded:])
                 
     def create_movie_nfo(self, metadata, download_path, filename='movie'):
         nfo_data = {
@@ -471,7 +789,7 @@ class mdownloader:
             nfo_file.write(nfo_content)
                 
     def series_downloader(self):
-        url = "https://www.zdf.de/serien"
+        url = self.args['series_url']
         response = requests.get(url)
         
         download_base_dir = self.args['download']
@@ -542,9 +860,30 @@ def main(headless=True):
     parser.add_argument("--index", help="Additional search parameter to select sources", nargs='+', type=int, default=[])
     parser.add_argument("--imdb", help="IMDB rating filter", type=float)
     parser.add_argument("--imdb-reset", help="IMDB reset", action="store_true")
+    parser.add_argument("--imdb-rate", help="Maximum IMDB requests per second (0: unlimited, concurrency still backs off when throttled)", type=float, default=0)
     parser.add_argument("--no-query", help="Directely use sources from local database", action="store_true")
     parser.add_argument("--nfo", help="create movies.nfo in download folder", action="store_true")
     parser.add_argument("--year", help="Minimum year for IMDB rating filter", type=int, default=2000)
+    parser.add_argument("--page-size", help="Number of results per API request", type=int, default=50)
+    parser.add_argument("--page-concurrency", help="Number of API requests kept in flight while paging", type=int, default=4)
+    parser.add_argument("--downloader", help="Download backend: built-in HTTP engine (native) or external wget", default="native", type=str, choices=["native", "wget"])
+    parser.add_argument("--timeout", help="Network timeout for downloads in seconds", default=30, type=int)
+    parser.add_argument("--jobs", help="Number of parallel downloads", default=1, type=int)
+    parser.add_argument("--per-host", help="Maximum parallel downloads per host", default=2, type=int)
+    parser.add_argument("--bandwidth", help="Global download bandwidth limit in MB/s (0: unlimited)", default=0, type=float)
+    parser.add_argument("--segments", help="Download large files in this many parallel byte ranges (native downloader)", default=1, type=int)
+    parser.add_argument("--plan", help="Select downloads that fit above --free: queue order, maximum count or maximum IMDB rating", default="order", type=str, choices=STRATEGIES)
+    parser.add_argument("--hash", help="Compute a checksum of every download while it is written (native downloader)", type=str, choices=["md5", "sha1", "sha256"])
+    parser.add_argument("--race", help="Start with the requested or the next higher quality, whichever first megabyte arrives faster, if the higher quality still fits above --free (native downloader)", action="store_true")
+    parser.add_argument("--head", help="Check all links with HEAD requests before planning: real sizes, dead links are dropped", action="store_true")
+    parser.add_argument("--head-ttl", help="Hours a cached HEAD result stays valid", default=24, type=float)
+    parser.add_argument("--metrics-dir", help="Write download metrics as JSON and Prometheus textfile (mdl.prom) into this directory after each run", type=str)
+    parser.add_argument("--api-url", help="MediathekViewWeb query API endpoint", default=API_URL, type=str)
+    parser.add_argument("--series-url", help="Series overview page used by --series", default=SERIES_URL, type=str)
+    parser.add_argument("--filmliste", help="Import a local MediathekView filmliste file (xz or plain) into the database", type=str)
+    parser.add_argument("--imdb-dataset", help="Directory with title.basics.tsv.gz and title.ratings.tsv.gz from datasets.imdbws.com, used to match IMDB ratings locally", type=str)
+    parser.add_argument("--delta", help="Stop paging at already known sources and serve the rest from the local database", action="store_true")
+    parser.add_argument("--explain", help="Print the query plan of every database query", action="store_true")
     parser.add_argument("--version",  action="store_true", help=f"show version")
     parser.add_argument("--upgrade",  action="store_true", help=f"ensure latest version")
 
@@ -558,6 +897,10 @@ def main(headless=True):
     if args.upgrade:
         VersionCheck().ensure_latest_version()
         exit()
+
+    if args.explain:
+        DataBaseManager(configdir=args.configdir).print_query_plans()
+        exit()
   
     # init object
     if headless: _ = mdownloader(**vars(args))
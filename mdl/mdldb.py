@@ -5,9 +5,14 @@
 from contextlib import contextmanager
 import os
 import json
+import queue
 import re
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Interval, BigInteger, Boolean, MetaData, inspect, text, not_, and_, or_, Table
+import socket
+import threading
+import unicodedata
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Interval, BigInteger, Boolean, MetaData, inspect, text, not_, and_, or_, Table, select, event, Index, table as sql_table, column as sql_column, exists
 from sqlalchemy.orm import sessionmaker, joinedload, declarative_base
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, timedelta, timezone
 from PyMovieDb import IMDB
 import pandas as pd
@@ -17,6 +22,8 @@ local_timezone = timezone(timedelta(hours=1))
 import importlib
 modules = [
     "mdl.thworker import *",
+    "mdl.exclusion import *",
+    "mdl.imdbclient import AdaptiveImdbClient",
 ]
 
 for module in modules:
@@ -29,6 +36,39 @@ for module in modules:
 
 Base = declarative_base()
 
+def fileformat_from_url(url):
+    """
+    Liest das Dateiformat (Endung) aus einer Video-URL, z.B. 'mp4'.
+    """
+    try:
+        return url.split('.')[-1].lower()
+    except:
+        return None
+
+def normalize_title(title):
+    """
+    Vereinheitlicht einen Filmtitel für Vergleiche: ohne Akzente, Satzzeichen und
+    Groß-/Kleinschreibung, mit einfachen Leerzeichen ('Amélie: Die  Fabelhafte' -> 'amelie die fabelhafte').
+    """
+    text = unicodedata.normalize('NFKD', str(title or ''))
+    text = ''.join(k for k in text if not unicodedata.combining(k)).casefold()
+    return ' '.join(re.sub(r'[\W_]+', ' ', text).split())
+
+QUALITY_COLUMNS = {
+    'H': 'url_video_hd',
+    'M': 'url_video',
+    'L': 'url_video_low',
+}
+
+QUALITY_RANK = {'L': 0, 'M': 1, 'H': 2}
+
+# Reihenfolge, in der die Varianten bei Fehlern probiert werden
+QUALITY_FALLBACK = {
+    'H': ['H', 'M', 'L'],
+    'M': ['M', 'L', 'H'],
+    'L': ['L', 'M', 'H'],
+}
+
 class Meta(Base):
     __tablename__ = 'metadata'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -56,6 +96,20 @@ class Source(Base):
     url_video_hd = Column(String)
     filmlisteTimestamp = Column(DateTime)
     fileformat = Column(String)
+    # stabiler Schlüssel für den FTS5-Index (die implizite rowid kann sich durch VACUUM ändern)
+    fts_rowid = Column(Integer)
+
+    __table_args__ = (
+        # covering index for the join on imdb.imdb_id (get_imdb_entry_over)
+        Index('ix_source_imdb_id', 'imdb_id', 'id'),
+        Index('ix_source_timestamp', 'timestamp'),
+        # matching Filmliste entries to sources from the API (get_source_ids_by_url)
+        Index('ix_source_url_video', 'url_video'),
+        # join of source_fts on its rowid (search_sources)
+        Index('ix_source_fts_rowid', 'fts_rowid', unique=True),
+        # legacy rows still waiting for the fileformat backfill
+        Index('ix_source_fileformat_missing', 'id', sqlite_where=text('fileformat IS NULL')),
+    )
     
 class IMDBEntry(Base):
     __tablename__ = 'imdb'
@@ -67,25 +121,186 @@ class IMDBEntry(Base):
     published = Column(DateTime)
     genre = Column(String)
 
+    __table_args__ = (
+        # covering index for rating filters (get_imdb_entry_over)
+        Index('ix_imdb_rating', 'rating', 'imdb_id'),
+        Index('ix_imdb_published', 'published'),
+        # entries with incomplete data (_get_imdb_id_to_reparse)
+        Index('ix_imdb_reparse', 'imdb_id', sqlite_where=text('genre IS NULL OR rating IS NOT NULL AND "ratingCount" IS NULL')),
+    )
+
 class Downloaded(Base):
     __tablename__ = 'downloaded'
     did = Column(Integer, primary_key=True, autoincrement=True)
     timestamp = Column(DateTime, default=lambda: datetime.now(local_timezone))
     source_id = Column(String, ForeignKey('source.id'))
+
+    __table_args__ = (
+        Index('ix_downloaded_source_id', 'source_id'),
+        Index('ix_downloaded_timestamp', 'timestamp'),
+    )
+
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+    query_key = Column(String, primary_key=True)
+    newest_timestamp = Column(BigInteger)
+    newest_id = Column(String)
+    synced_at = Column(DateTime)
+
+class QuerySource(Base):
+    __tablename__ = 'query_source'
+    query_key = Column(String, ForeignKey('sync_state.query_key'), primary_key=True)
+    source_id = Column(String, ForeignKey('source.id'), primary_key=True)
+    
+class DownloadJob(Base):
+    __tablename__ = 'download_job'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(String, ForeignKey('source.id'), unique=True)
+    url = Column(String)
+    basedir = Column(String)
+    filename = Column(String)
+    size = Column(BigInteger)
+    meta = Column(String)
+    state = Column(String, default='queued')
+    bytes_done = Column(BigInteger, default=0)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String)
+    http_status = Column(Integer)
+    created = Column(DateTime)
+    updated = Column(DateTime)
+    verified = Column(Boolean)
+    content_length = Column(BigInteger)
+    hash = Column(String)
+    mp4_moov = Column(Boolean)
+    verify_error = Column(String)
+    variants = Column(String)
+    quality = Column(String)
+    # Prozess, der den Job gerade lädt ('host:pid'); 'updated' dient als Lease
+    owner = Column(String)
+
+    __table_args__ = (
+        Index('ix_download_job_state', 'state', 'id'),
+    )
+
+# Laufende Jobs, deren Lease so lange nicht erneuert wurde, gelten als abgebrochen
+JOB_LEASE = timedelta(minutes=10)
+
+def job_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class DownloadMetric(Base):
+    __tablename__ = 'download_metric'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(String, ForeignKey('source.id'))
+    host = Column(String)
+    channel = Column(String)
+    quality = Column(String)
+    status = Column(Integer)
+    success = Column(Boolean)
+    bytes = Column(BigInteger)
+    resumed = Column(BigInteger)
+    duration = Column(Float)
+    ttfb = Column(Float)
+    avg_throughput = Column(Float)
+    peak_throughput = Column(Float)
+    retries = Column(Integer)
+    finished = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_download_metric_finished', 'finished'),
+    )
+
+class UrlHead(Base):
+    __tablename__ = 'url_head'
+    url = Column(String, primary_key=True)
+    status = Column(Integer)
+    content_length = Column(BigInteger)
+    accept_ranges = Column(Boolean)
+    last_modified = Column(String)
+    checked_at = Column(DateTime)
+
+class IMDBLookup(Base):
+    __tablename__ = 'imdb_lookup'
+    lookup_key = Column(String, primary_key=True)
+    title = Column(String)
+    year = Column(Integer)
+    tv = Column(Boolean)
+    result = Column(String)
+    imdb_id = Column(String)
+    checked_at = Column(DateTime)
+
+class IMDBTitle(Base):
+    """
+    Titel aus dem lokalen IMDB-Datensatz (title.basics.tsv.gz).
+    """
+    __tablename__ = 'imdb_title'
+    tconst = Column(String, primary_key=True)
+    title_type = Column(String)
+    primary_title = Column(String)
+    original_title = Column(String)
+    primary_norm = Column(String)
+    original_norm = Column(String)
+    start_year = Column(Integer)
+    genres = Column(String)
+
+    __table_args__ = (
+        # lookups by normalized title and year (match_imdb_dataset)
+        Index('ix_imdb_title_primary', 'primary_norm', 'start_year'),
+        Index('ix_imdb_title_original', 'original_norm', 'start_year'),
+    )
+
+class IMDBRating(Base):
+    """
+    Bewertungen aus dem lokalen IMDB-Datensatz (title.ratings.tsv.gz).
+    """
+    __tablename__ = 'imdb_rating'
+    tconst = Column(String, primary_key=True)
+    average_rating = Column(Float)
+    num_votes = Column(Integer)
+
+# Titeltypen des IMDB-Datensatzes für Filme bzw. Serien
+IMDB_DATASET_TYPES = {
+    False: ('movie', 'tvMovie', 'video'),
+    True: ('tvSeries', 'tvMiniSeries'),
+}
+
+class SchemaFlag(Base):
+    __tablename__ = 'schema_flag'
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime)
     
 class DataBaseManager:
-    def __init__(self, configdir = "~/.config/mdl"):
+    def __init__(self, configdir = "~/.config/mdl", imdb_rate = 0):
         config_folder = os.path.expanduser(configdir)
         os.makedirs(config_folder, exist_ok=True)
 
         db_path = os.path.join(config_folder, "data.db")
         self.engine = create_engine(f"sqlite:///{db_path}")
+        event.listen(self.engine, 'connect', self._register_sql_functions)
         
         self.ensure_all_tables()
         
-        self.update_fileformat_from_url_video()
+        self._run_once('fileformat_backfill', self.update_fileformat_from_url_video)
         
+        # Schreibzugriffe aus Worker-Threads laufen innerhalb von batched_writes über einen Schreib-Thread
+        self._write_queue = None
+        self.writes = {'writes': 0, 'batches': 0}
+
         self.imdb = IMDB()
+        self.imdb_client = AdaptiveImdbClient(self.imdb, rate=imdb_rate)
+        # Anzahl der Suchanfragen an IMDB (für Statistiken)
+        self.imdb_requests = 0
+        self._imdb_lock = threading.Lock()
+        # Gültigkeit gecachter IMDB-Suchen je Ergebnis
+        self.imdb_ttl = {
+            'hit': timedelta(days=90),
+            'miss': timedelta(days=14),
+            'error': timedelta(hours=1),
+        }
+
+    @staticmethod
+    def _register_sql_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('mdl_fileformat', 1, fileformat_from_url)
 
     @contextmanager
     def get_session(self):
@@ -106,11 +321,11 @@ class DataBaseManager:
         pass
     
     def _drop_imdb_id(self, id):
-        with self.get_session() as session:
-            entry = session.query(IMDBEntry).filter_by(imdb_id=id).first()
-            if entry:
-                session.delete(entry)
-                session.commit()
+        def write(connection):
+            connection.execute(IMDBEntry.__table__.delete().where(IMDBEntry.imdb_id == id))
+            # gecachte Treffer auf diese ID verwerfen, die nächste Suche fragt IMDB erneut
+            connection.execute(IMDBLookup.__table__.delete().where(IMDBLookup.imdb_id == id))
+        self._write(write)
                 
     def _reset_imdb(self):
         with self.get_session() as session:
@@ -118,6 +333,7 @@ class DataBaseManager:
             session.query(Source).update({Source.imdb_id: None, Source.imdb_parsed: False})
             # Delete all entries in the imdb table
             session.query(IMDBEntry).delete()
+            session.query(IMDBLookup).delete()
             session.commit()
                 
     def _get_downloaded(self, within=None):
@@ -170,7 +386,9 @@ class DataBaseManager:
                     })
                 downloaded_list.append(item_info)
             
-            DF_downloaded = pd.DataFrame(downloaded_list).sort_values('timestamp', ascending=True)
+            DF_downloaded = pd.DataFrame(downloaded_list)
+            if not DF_downloaded.empty:
+                DF_downloaded = DF_downloaded.sort_values('timestamp', ascending=True)
 
             return DF_downloaded
         
@@ -181,17 +399,18 @@ class DataBaseManager:
         data = DF_imdb.to_dict(orient='records')
         
         if len(data)>0:
-            myworker = ThreadedWorker(data, self._update_imdb_info_entry, info='Getting metadata from IMDB for downloaded items')
-            myworker.start_processing()
+            with self.batched_writes():
+                myworker = ThreadedWorker(data, self._update_imdb_info_entry, info='Getting metadata from IMDB for downloaded items')
+                myworker.start_processing()
         
     def _reparse_imdb_item(self, imdb_id):
         try:
-            entry = self.load_json_or_use_dict(self.imdb.get_by_id(imdb_id))
+            entry = self.load_json_or_use_dict(self.imdb_client.get_by_id(imdb_id))
             if entry.get('status', 200) == 200:
                 self._add_imdb_entry(entry, source_id=None)
-            else:
-                if entry.get('status') == 404:
-                    self._drop_imdb_id(imdb_id)
+            elif self.imdb_client.last_status() == 404:
+                # nur ein echtes 404 von IMDB löscht den Eintrag, sonst beim nächsten Lauf erneut versuchen
+                self._drop_imdb_id(imdb_id)
 
         except Exception as e:
             print(f"Error updating IMDB info for id '{imdb_id}': {e}")
@@ -201,8 +420,9 @@ class DataBaseManager:
         
         if len(data)>0:
             print('Cleanup IMDB data')
-            myworker = ThreadedWorker(data, self._reparse_imdb_item)
-            myworker.start_processing()
+            with self.batched_writes():
+                myworker = ThreadedWorker(data, self._reparse_imdb_item)
+                myworker.start_processing()
 
     def _get_imdb_id_to_reparse(self):
         """
@@ -238,9 +458,8 @@ class DataBaseManager:
 
     def get_imdb_entry_over(self, score = 7):
         with self.get_session() as session:
-            source_ids_with_score = session.query(Source.id).join(IMDBEntry, Source.imdb_id == IMDBEntry.imdb_id).filter(
-                IMDBEntry.rating >= score
-            ).distinct().all()
+            imdb_ids_with_score = session.query(IMDBEntry.imdb_id).filter(IMDBEntry.rating >= score)
+            source_ids_with_score = session.query(Source.id).filter(Source.imdb_id.in_(imdb_ids_with_score)).all()
             source_ids_list = [source_id for (source_id,) in source_ids_with_score]
             return source_ids_list
 
@@ -278,54 +497,248 @@ class DataBaseManager:
             all_ids = session.query(IMDBEntry.imdb_id).all()
             return [entry.imdb_id for entry in all_ids]
         
+    @staticmethod
+    def _imdb_lookup_key(title, year=None, tv=False):
+        return f"{normalize_title(title)}|{year or ''}|{int(bool(tv))}"
+
+    def get_imdb_lookup(self, title, year=None, tv=False):
+        """
+        Gibt das gecachte Ergebnis einer IMDB-Suche zurück ({'result', 'imdb_id'}) oder None,
+        wenn es keines gibt oder seine TTL abgelaufen ist.
+        """
+        with self.engine.connect() as connection:
+            row = connection.execute(select(IMDBLookup).where(IMDBLookup.lookup_key == self._imdb_lookup_key(title, year, tv))).mappings().first()
+        if row is None or row['checked_at'] < datetime.now() - self.imdb_ttl.get(row['result'], timedelta(0)):
+            return None
+        return {'result': row['result'], 'imdb_id': row['imdb_id']}
+
+    def save_imdb_lookup(self, title, year=None, tv=False, result='miss', imdb_id=None):
+        values = {
+            'lookup_key': self._imdb_lookup_key(title, year, tv),
+            'title': normalize_title(title),
+            'year': year,
+            'tv': bool(tv),
+            'result': result,
+            'imdb_id': imdb_id,
+            'checked_at': datetime.now(),
+        }
+        stmt = sqlite_insert(IMDBLookup.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=['lookup_key'], set_={k: v for k, v in values.items() if k != 'lookup_key'})
+        self._write(lambda connection: connection.execute(stmt))
+
+    @staticmethod
+    def _imdb_parsed_statement(source_ids, imdb_id=None):
+        """
+        UPDATE, das Quellen als von IMDB geparst markiert (und optional die IMDB-ID setzt).
+        """
+        values = {'imdb_parsed': True} if imdb_id is None else {'imdb_id': imdb_id, 'imdb_parsed': True}
+        return Source.__table__.update().where(Source.id.in_(list(source_ids))).values(**values)
+
+    def replace_imdb_dataset(self, model, rows, batch_size=10000):
+        """
+        Ersetzt den Inhalt einer Tabelle des IMDB-Datensatzes (IMDBTitle oder IMDBRating) durch
+        die Zeilen aus rows. Alles läuft in einer Transaktion, ein abgebrochener Import lässt die
+        alten Daten stehen.
+
+        :param rows: Iterierbare Dictionaries, werden blockweise geschrieben
+        :return: Anzahl der Zeilen
+        """
+        count = 0
+        batch = []
+        with self.engine.begin() as connection:
+            connection.execute(model.__table__.delete())
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    connection.execute(sqlite_insert(model.__table__).on_conflict_do_nothing(), batch)
+                    count += len(batch)
+                    batch.clear()
+            if batch:
+                connection.execute(sqlite_insert(model.__table__).on_conflict_do_nothing(), batch)
+                count += len(batch)
+        return count
+
+    def has_imdb_dataset(self):
+        with self.engine.connect() as connection:
+            return connection.execute(select(IMDBTitle.tconst).limit(1)).first() is not None
+
+    def match_imdb_dataset(self, candidates, chunk_size=200):
+        """
+        Ordnet Titel blockweise per SQL dem lokalen IMDB-Datensatz zu: gleicher normierter
+        Haupt- oder Originaltitel, passender Typ und Jahr (±1). Gibt es mehrere Treffer, gewinnt
+        das genaue Jahr, dann die meisten Stimmen. Ohne Jahr zählt nur ein eindeutiger Titel,
+        sonst gilt der Kandidat als nicht gefunden.
+
+        :param candidates: Liste von Dictionaries mit 'title', 'year' und optional 'tv'
+        :return: Ein Dictionary Lookup-Schlüssel -> Zeile aus imdb_title mit Bewertung
+        """
+        rows = {}
+        for candidate in candidates:
+            key = self._imdb_lookup_key(candidate['title'], candidate.get('year'), candidate.get('tv', False))
+            rows[key] = (key, normalize_title(candidate['title']), candidate.get('year'), int(bool(candidate.get('tv', False))))
+        rows = list(rows.values())
+
+        types = ' OR '.join(
+            f"(imdb_candidate.tv = {int(tv)} AND t.title_type IN ({', '.join(repr(k) for k in title_types)}))"
+            for tv, title_types in IMDB_DATASET_TYPES.items()
+        )
+        # UNION: ein Titel, der über Haupt- und Originaltitel passt, zählt nur einmal
+        matches = ' UNION '.join(f"""
+            SELECT imdb_candidate.lookup_key, imdb_candidate.year, t.tconst, t.title_type, t.primary_title, t.start_year, t.genres
+            FROM imdb_candidate JOIN imdb_title t ON t.{column} = imdb_candidate.title
+            WHERE (imdb_candidate.year IS NULL OR t.start_year BETWEEN imdb_candidate.year - 1 AND imdb_candidate.year + 1) AND ({types})""" for column in ['primary_norm', 'original_norm'])
+
+        result = {}
+        with self.engine.connect() as connection:
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i:i + chunk_size]
+                query = f"""
+                    WITH imdb_candidate(lookup_key, title, year, tv) AS (VALUES {', '.join(['(?, ?, ?, ?)'] * len(chunk))})
+                    SELECT * FROM (
+                        SELECT m.*, r.average_rating, r.num_votes, ROW_NUMBER() OVER (
+                            PARTITION BY m.lookup_key
+                            ORDER BY ABS(COALESCE(m.start_year - m.year, 0)), COALESCE(r.num_votes, 0) DESC, m.tconst
+                        ) AS rank, COUNT(*) OVER (PARTITION BY m.lookup_key) AS title_count
+                        FROM ({matches}) m
+                        LEFT JOIN imdb_rating r ON r.tconst = m.tconst
+                    ) WHERE rank = 1 AND (year IS NOT NULL OR title_count = 1)"""
+                parameters = tuple(value for row in chunk for value in row)
+                result.update((row['lookup_key'], dict(row)) for row in connection.exec_driver_sql(query, parameters).mappings())
+        return result
+
+    def resolve_from_imdb_dataset(self, groups):
+        """
+        Löst Gruppen von Quellen (wie bei update_imdb_info_group) über den lokalen IMDB-Datensatz
+        auf und schreibt IMDB-Einträge, Quellen und den Such-Cache in einem Schritt.
+
+        :return: Lookup-Schlüssel der aufgelösten Gruppen
+        """
+        matches = self.match_imdb_dataset(groups)
+        if not matches:
+            return set()
+
+        types = {'movie': 'Movie', 'tvMovie': 'TVMovie', 'video': 'Video', 'tvSeries': 'TVSeries', 'tvMiniSeries': 'TVSeries'}
+        entries = {}
+        sources = {}
+        lookups = []
+        for group in groups:
+            key = self._imdb_lookup_key(group['title'], group.get('year'), group.get('tv', False))
+            match = matches.get(key)
+            if match is None:
+                continue
+            entries[match['tconst']] = {
+                'imdb_id': match['tconst'],
+                'typ': types.get(match['title_type'], match['title_type']),
+                'name': match['primary_title'],
+                'rating': match['average_rating'],
+                'ratingCount': match['num_votes'],
+                'published': datetime(match['start_year'], 1, 1) if match['start_year'] else datetime(1970, 1, 1),
+                'genre': match['genres'] or 'UNDEFINED',
+            }
+            sources.setdefault(match['tconst'], []).extend(group['source_ids'])
+            lookups.append({
+                'lookup_key': key,
+                'title': normalize_title(group['title']),
+                'year': group.get('year'),
+                'tv': bool(group.get('tv', False)),
+                'result': 'hit',
+                'imdb_id': match['tconst'],
+                'checked_at': datetime.now(),
+            })
+
+        stmt = sqlite_insert(IMDBEntry.__table__)
+        stmt = stmt.on_conflict_do_update(index_elements=['imdb_id'], set_={k: stmt.excluded[k] for k in ['typ', 'name', 'rating', 'ratingCount', 'published', 'genre']})
+        lookup = sqlite_insert(IMDBLookup.__table__)
+        lookup = lookup.on_conflict_do_update(index_elements=['lookup_key'], set_={k: lookup.excluded[k] for k in ['title', 'year', 'tv', 'result', 'imdb_id', 'checked_at']})
+        def write(connection):
+            connection.execute(stmt, list(entries.values()))
+            connection.execute(lookup, lookups)
+            for imdb_id, source_ids in sources.items():
+                connection.execute(self._imdb_parsed_statement(source_ids, imdb_id))
+        self._write(write)
+
+        return {k['lookup_key'] for k in lookups}
+
     def _update_imdb_info_entry(self, source_id=None, title=None, tv=False, year=None):
+        self.update_imdb_info_group([source_id] if source_id else [], title=title, tv=tv, year=year)
+
+    def update_imdb_info_group(self, source_ids, title=None, tv=False, year=None):
+        """
+        Sucht einen Titel einmal bei IMDB (bzw. im Cache) und trägt das Ergebnis in einem
+        Schritt bei allen Quellen der Gruppe ein. Scheitert die Suche (Drosselung, Netzwerk
+        oder ein unerwarteter Fehler), bleiben die Quellen ungeparst und werden beim nächsten
+        Lauf erneut gesucht.
+        """
+        imdb_id = None
+        retryable = False
         try:
             try:
                 year = int(year)
             except:
                 year = None
 
-            entry = self.load_json_or_use_dict(self.imdb.get_by_name(title, tv=tv, year=year))
-            if entry.get('status', 200) == 200:
-                self._add_imdb_entry(entry, source_id=source_id)
+            # erst im Cache nachsehen (auch erfolglose Suchen werden gecacht)
+            cached = self.get_imdb_lookup(title, year, tv)
+            if cached is not None:
+                imdb_id = cached['imdb_id'] if cached['result'] == 'hit' else None
+                retryable = cached['result'] == 'error'
+                return
+
+            try:
+                with self._imdb_lock:
+                    self.imdb_requests += 1
+                entry = self.load_json_or_use_dict(self.imdb_client.get_by_name(title, tv=tv, year=year))
+            except Exception:
+                # kein endgültiges 'nicht gefunden': nur kurz cachen und später erneut suchen
+                self.save_imdb_lookup(title, year, tv, result='error')
+                raise
+
+            if entry and entry.get('status', 200) == 200:
+                imdb_id = self._add_imdb_entry(entry)
+                self.save_imdb_lookup(title, year, tv, result='hit' if imdb_id else 'miss', imdb_id=imdb_id)
+            else:
+                self.save_imdb_lookup(title, year, tv, result='miss')
         except Exception as e:
+            retryable = True
             print(f"Error updating IMDB info for title '{title}': {e}")
         finally:
-            self.save_sources([{'id': source_id, 'imdb_parsed': True}], update = True)
+            if source_ids and (imdb_id or not retryable):
+                statement = self._imdb_parsed_statement(source_ids, imdb_id)
+                self._write(lambda connection: connection.execute(statement))
 
     def _add_imdb_entry(self, entry, source_id=None):
         """
-        Fügt einen IMDB-Eintrag in die Datenbank ein.
+        Fügt einen IMDB-Eintrag in die Datenbank ein oder aktualisiert ihn.
+
+        :return: Die IMDB-ID oder None
         """
-        with self.get_session() as session:
-            entry = self.load_json_or_use_dict(entry)
-            if entry:
-                imdb_id_match = re.search(r'/tt(\d+)/', entry.get('url'))
-                imdb_id = 'tt' + imdb_id_match.group(1) if imdb_id_match else None
-                
-                existing_entry = session.query(IMDBEntry).filter_by(imdb_id=imdb_id).first()
-                source_data = {
-                    'typ': entry.get('type'),
-                    'name': entry.get('name'),
-                    'rating': entry.get('rating', {}).get('ratingValue'),
-                    'published': datetime.strptime(entry.get('datePublished') if entry.get('datePublished')!=None else '1970-01-01', "%Y-%m-%d"),
-                    'genre': ','.join(entry.get('genre') if entry.get('genre')!=None else ['UNDEFINED']),
-                    'ratingCount' : entry.get('rating', {}).get('ratingCount'),
-                }
-            
-                if existing_entry:
-                    # Update existing entry
-                    for key, value in source_data.items():
-                        setattr(existing_entry, key, value)
-                else:
-                    # Add new entry
-                    source_data['imdb_id'] = imdb_id
-                    session.add(IMDBEntry(**source_data))
-                
-                session.commit()
+        entry = self.load_json_or_use_dict(entry)
+        if not entry:
+            return None
+        imdb_id_match = re.search(r'/tt(\d+)/', entry.get('url') or '')
+        imdb_id = 'tt' + imdb_id_match.group(1) if imdb_id_match else None
+        if imdb_id is None:
+            return None
 
-                if source_id:
-                    self.save_sources([{'id':source_id, 'imdb_id':imdb_id, 'imdb_parsed':True}], update = True)
+        values = {
+            'imdb_id': imdb_id,
+            'typ': entry.get('type'),
+            'name': entry.get('name'),
+            'rating': entry.get('rating', {}).get('ratingValue'),
+            'published': datetime.strptime(entry.get('datePublished') if entry.get('datePublished')!=None else '1970-01-01', "%Y-%m-%d"),
+            'genre': ','.join(entry.get('genre') if entry.get('genre')!=None else ['UNDEFINED']),
+            'ratingCount' : entry.get('rating', {}).get('ratingCount'),
+        }
+        stmt = sqlite_insert(IMDBEntry.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=['imdb_id'], set_={k: v for k, v in values.items() if k != 'imdb_id'})
+
+        def write(connection):
+            connection.execute(stmt)
+            if source_id:
+                connection.execute(self._imdb_parsed_statement([source_id], imdb_id))
+        self._write(write)
+
+        return imdb_id
 
     @staticmethod
     def load_json_or_use_dict(input_data):
@@ -339,24 +752,109 @@ class DataBaseManager:
     def update_fileformat_from_url_video(self):
         """
         Aktualisiert das 'fileformat'-Attribut für alle Zeilen, in denen 'fileformat' NULL ist,
-        indem der Wert aus 'url_video' ausgelesen wird.
+        indem der Wert aus 'url_video' ausgelesen wird (ein einziges UPDATE in SQL).
         """
-        with self.get_session() as session:
-            # Alle Zeilen auswählen, in denen 'fileformat' NULL ist
-            null_fileformat_entries = session.query(Source).filter(Source.fileformat.is_(None)).all()
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "UPDATE source SET fileformat = mdl_fileformat(url_video) "
+                "WHERE fileformat IS NULL AND url_video IS NOT NULL"
+            ))
+
+    def _write(self, function):
+        """
+        Führt die Änderung function(connection) in einer Transaktion aus. Innerhalb von
+        batched_writes wird sie stattdessen an den Schreib-Thread übergeben.
+        """
+        writes = self._write_queue
+        if writes is None:
+            with self.engine.begin() as connection:
+                function(connection)
+        else:
+            writes.put(function)
 
-            # Durch jede Zeile iterieren und 'fileformat' aktualisieren
-            for entry in null_fileformat_entries:
-                # 'fileformat' aus 'url_video' auslesen
+    def _apply_writes(self, batch):
+        """
+        Schreibt einen Block in einer Transaktion und gibt die Fehler der Änderungen zurück,
+        die dabei fehlgeschlagen sind.
+        """
+        errors = []
+        try:
+            with self.engine.begin() as connection:
+                for function in batch:
+                    function(connection)
+        except Exception:
+            # einzeln wiederholen, damit eine fehlerhafte Änderung nicht den ganzen Block verwirft
+            for function in batch:
                 try:
-                    fileformat = entry.url_video.split('.')[-1].lower()
-                except:
-                    continue
+                    with self.engine.begin() as connection:
+                        function(connection)
+                except Exception as e:
+                    errors.append(e)
+        self.writes['writes'] += len(batch)
+        self.writes['batches'] += 1
+        return errors
 
-                entry.fileformat = fileformat
-                    
-            # Änderungen in die Datenbank schreiben
-            session.commit()
+    def _writer(self, writes, batch_size, errors):
+        while True:
+            batch = [writes.get()]
+            # alles mitnehmen, was während des letzten Commits aufgelaufen ist
+            while len(batch) < batch_size and batch[-1] is not None:
+                try:
+                    batch.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            batch = [function for function in batch if function is not None]
+            if batch:
+                errors.extend(self._apply_writes(batch))
+            if stop:
+                return
+
+    @contextmanager
+    def batched_writes(self, max_pending=1000, batch_size=200):
+        """
+        Solange der Block läuft, schreibt ein einzelner Thread alle Änderungen aus _write
+        blockweise in gemeinsamen Transaktionen, statt dass jeder Worker-Thread selbst committet
+        und um die Schreibsperre von SQLite konkurriert. Die Warteschlange ist auf max_pending
+        Änderungen begrenzt (Worker warten dann), beim Verlassen wird sie vollständig geschrieben.
+        Ist dabei eine Änderung fehlgeschlagen, wird danach ihr Fehler ausgelöst (bei mehreren
+        der erste), die übrigen Änderungen sind dann trotzdem geschrieben.
+        """
+        if self._write_queue is not None:
+            yield
+            return
+
+        writes = queue.Queue(maxsize=max_pending)
+        errors = []
+        writer = threading.Thread(target=self._writer, args=(writes, batch_size, errors), daemon=True)
+        writer.start()
+        self._write_queue = writes
+        try:
+            yield
+        finally:
+            self._write_queue = None
+            writes.put(None)
+            writer.join()
+        if errors:
+            if len(errors) > 1:
+                print(f"{len(errors)} batched writes failed")
+            raise errors[0]
+
+    def _has_schema_flag(self, name):
+        with self.engine.connect() as connection:
+            return connection.execute(select(SchemaFlag.name).where(SchemaFlag.name == name)).first() is not None
+
+    def _set_schema_flag(self, name):
+        with self.engine.begin() as connection:
+            connection.execute(sqlite_insert(SchemaFlag.__table__).values(name=name, applied_at=datetime.now()).on_conflict_do_nothing(index_elements=['name']))
+
+    def _run_once(self, name, function):
+        """
+        Führt eine einmalige Migration aus und merkt sich das über ein Schema-Flag.
+        """
+        if not self._has_schema_flag(name):
+            function()
+            self._set_schema_flag(name)
     
     def ensure_all_tables(self):
         ## clean up typo in database
@@ -412,36 +910,348 @@ class DataBaseManager:
                         # Print a message indicating that the column has been created
                         print(f"Column '{column.name}' added to table '{table_name}'.")
 
-    def save_sources(self, source_data_list, update = False):
-        with self.get_session() as session:
-            for source_data in source_data_list:
-                source_id = source_data.get('id')
-                existing_entry = None
+        self.ensure_indexes()
 
-                if source_id:
-                    existing_entry = session.query(Source).filter_by(id=source_id).first()
+        self.ensure_fulltext()
 
-                # Convert relevant columns
-                for key in ['timestamp', 'filmlisteTimestamp']:
-                    source_data[key] = datetime.fromtimestamp(int(source_data[key])) if source_data.get(key) else None
-                source_data['duration'] = timedelta(seconds=source_data['duration']) if source_data.get('duration') else None
+    def ensure_fulltext(self):
+        """
+        Legt den FTS5-Index 'source_fts' über title, topic, description und channel an.
+        Er verweist über die Spalte fts_rowid auf 'source' (external content) und wird über
+        Trigger aktuell gehalten. fts_rowid wird beim Einfügen einmal vergeben und ändert sich
+        danach nicht, auch nicht durch VACUUM. Fehlt FTS5 in der SQLite-Version, wird auf
+        LIKE-Suche zurückgefallen.
+        """
+        statements = [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS source_fts USING fts5(
+                title, topic, description, channel, content='source', content_rowid='fts_rowid'
+            )""",
+            """CREATE TRIGGER IF NOT EXISTS source_fts_ai AFTER INSERT ON source BEGIN
+                UPDATE source SET fts_rowid = (SELECT COALESCE(MAX(fts_rowid), 0) + 1 FROM source)
+                WHERE rowid = new.rowid AND fts_rowid IS NULL;
+                INSERT INTO source_fts(rowid, title, topic, description, channel)
+                SELECT fts_rowid, title, topic, description, channel FROM source WHERE rowid = new.rowid;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS source_fts_ad AFTER DELETE ON source BEGIN
+                INSERT INTO source_fts(source_fts, rowid, title, topic, description, channel)
+                VALUES ('delete', old.fts_rowid, old.title, old.topic, old.description, old.channel);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS source_fts_au AFTER UPDATE OF title, topic, description, channel ON source
+            WHEN old.title IS NOT new.title OR old.topic IS NOT new.topic
+                OR old.description IS NOT new.description OR old.channel IS NOT new.channel
+            BEGIN
+                INSERT INTO source_fts(source_fts, rowid, title, topic, description, channel)
+                VALUES ('delete', old.fts_rowid, old.title, old.topic, old.description, old.channel);
+                INSERT INTO source_fts(rowid, title, topic, description, channel)
+                VALUES (new.fts_rowid, new.title, new.topic, new.description, new.channel);
+            END""",
+        ]
+        try:
+            # Index und Trigger älterer Versionen verwiesen auf die implizite rowid
+            self._run_once('fts_stable_rowid', self._migrate_fulltext_rowid)
+            with self.engine.begin() as connection:
+                for statement in statements:
+                    connection.execute(text(statement))
+            self.fts_enabled = True
+        except Exception as e:
+            print(f"Full-text search not available, falling back to LIKE: {e}")
+            self.fts_enabled = False
+            return
 
+        self._run_once('fts_rebuild_stable_rowid', self._rebuild_fulltext)
 
-                if existing_entry:
-                    # Update existing entry
-                    with session.begin_nested():
-                        for key, value in source_data.items():
-                            setattr(existing_entry, key, value)
+    def _migrate_fulltext_rowid(self):
+        """
+        Vergibt fts_rowid für vorhandene Quellen und entfernt den alten Index samt Triggern
+        (er wird anschließend neu angelegt und aufgebaut).
+        """
+        with self.engine.begin() as connection:
+            for name in ['source_fts_ai', 'source_fts_ad', 'source_fts_au']:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            connection.execute(text("DROP TABLE IF EXISTS source_fts"))
+            connection.execute(text("UPDATE source SET fts_rowid = rowid WHERE fts_rowid IS NULL"))
+
+    def _rebuild_fulltext(self):
+        """
+        Baut den FTS5-Index komplett aus der Tabelle 'source' neu auf.
+        """
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO source_fts(source_fts) VALUES ('rebuild')"))
+
+    def ensure_indexes(self):
+        """
+        Legt alle an den Modellen deklarierten Indizes an und entfernt verwaiste 'ix_'-Indizes
+        auf diesen Tabellen, die nicht mehr deklariert sind.
+        """
+        with self.engine.begin() as connection:
+            existing = {
+                name: table_name for name, table_name in connection.execute(
+                    text("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix\\_%' ESCAPE '\\'")
+                )
+            }
+            declared = set()
+            for table_name, table in Base.metadata.tables.items():
+                for index in table.indexes:
+                    declared.add(index.name)
+                    if index.name not in existing:
+                        index.create(bind=connection)
+                        print(f"Index '{index.name}' created on table '{table_name}'.")
+
+            for name, table_name in existing.items():
+                if name not in declared and table_name in Base.metadata.tables:
+                    connection.execute(text(f'DROP INDEX "{name}"'))
+                    print(f"Index '{name}' dropped from table '{table_name}'.")
+
+    @staticmethod
+    def _to_datetime(value):
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromtimestamp(int(value)) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _to_timedelta(value):
+        if isinstance(value, timedelta):
+            return value
+        try:
+            return timedelta(seconds=value) if value else None
+        except (TypeError, ValueError):
+            return None
+
+    def _normalize_source_records(self, source_data_list):
+        """
+        Bereitet API-Datensätze spaltenweise für den Bulk-Upsert vor: unbekannte Schlüssel
+        werden verworfen, Zeitstempel und Dauer umgewandelt. Nur tatsächlich übergebene
+        Spalten werden geschrieben, Teil-Updates lassen die übrigen Spalten unverändert.
+        'fileformat' wird direkt aus 'url_video' abgeleitet.
+        """
+        columns = Source.__table__.columns.keys()
+        records = [{k: v for k, v in source_data.items() if k in columns} for source_data in source_data_list if source_data.get('id')]
+
+        for key in ['timestamp', 'filmlisteTimestamp']:
+            for record in records:
+                if key in record:
+                    record[key] = self._to_datetime(record[key])
+        for record in records:
+            if 'duration' in record:
+                record['duration'] = self._to_timedelta(record['duration'])
+            if 'url_video' in record and 'fileformat' not in record:
+                record['fileformat'] = fileformat_from_url(record['url_video'])
+
+        return records
+
+    def save_sources(self, source_data_list, chunk_size=500):
+        """
+        Schreibt Quellen per INSERT ... ON CONFLICT(id) DO UPDATE in einer Transaktion.
+        Datensätze mit gleichen Spalten werden in Blöcken von chunk_size per executemany geschrieben.
+
+        :return: Ein Dictionary mit der Anzahl eingefügter und aktualisierter Quellen
+        """
+        records = self._normalize_source_records(source_data_list)
+        counts = {'inserted': 0, 'updated': 0}
+
+        # Datensätze nach Spaltensatz gruppieren, damit jede Gruppe ein Statement teilt
+        groups = {}
+        for record in records:
+            groups.setdefault(tuple(sorted(record)), []).append(record)
+
+        with self.engine.begin() as connection:
+            for columns, group in groups.items():
+                stmt = sqlite_insert(Source.__table__)
+                update_columns = {column: stmt.excluded[column] for column in columns if column != 'id'}
+                if update_columns:
+                    stmt = stmt.on_conflict_do_update(index_elements=['id'], set_=update_columns)
                 else:
-                    # Add new entry
-                    source_entry = Source(**source_data)
-                    with session.begin_nested():
-                        session.add(source_entry)
-            
-            session.commit()
-    
-        self.update_fileformat_from_url_video()
+                    stmt = stmt.on_conflict_do_nothing(index_elements=['id'])
+
+                for i in range(0, len(group), chunk_size):
+                    chunk = group[i:i + chunk_size]
+                    ids = set(record['id'] for record in chunk)
+                    existing = set(connection.execute(select(Source.id).where(Source.id.in_(ids))).scalars())
+                    counts['updated'] += len(existing)
+                    counts['inserted'] += len(ids - existing)
+                    connection.execute(stmt, chunk)
+
+        return counts
                 
+    def enqueue_download_jobs(self, jobs, permanent=(404, 410)):
+        """
+        Legt Download-Jobs an oder stellt vorhandene Jobs derselben Quelle wieder in die Warteschlange.
+        Fortschritt (bytes_done, attempts) bleibt dabei erhalten. Jobs, die mit einem dauerhaften
+        HTTP-Fehler (`permanent`) gescheitert sind, bleiben failed.
+
+        :param jobs: Liste von Dicts mit source_id, url, basedir, filename, size, meta (Dict) und
+                     variants (Liste von [Qualität, URL] in Reihenfolge der Ausweichversuche)
+        """
+        now = datetime.now()
+        records = [dict(job, meta=json.dumps(job.get('meta') or {}, ensure_ascii=False, default=str), variants=json.dumps(job.get('variants') or []), state='queued', created=now, updated=now) for job in jobs]
+        if not records:
+            return
+        stmt = sqlite_insert(DownloadJob.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['source_id'],
+            set_={column: stmt.excluded[column] for column in ['url', 'basedir', 'filename', 'size', 'meta', 'variants', 'state', 'updated']},
+            # laufende Jobs (anderer Prozess) und dauerhaft gescheiterte Jobs nicht anfassen
+            where=and_(
+                DownloadJob.__table__.c.state != 'running',
+                or_(
+                    DownloadJob.__table__.c.state != 'failed',
+                    DownloadJob.__table__.c.http_status.is_(None),
+                    # kein IN: erweiterte Parameter gehen mit executemany nicht
+                    and_(*[DownloadJob.__table__.c.http_status != status for status in permanent]),
+                ),
+            ),
+        )
+        with self.engine.begin() as connection:
+            connection.execute(stmt, records)
+
+    def resume_download_jobs(self, permanent=(404, 410), lease=JOB_LEASE):
+        """
+        Schließt Jobs ab, deren Quelle inzwischen als heruntergeladen markiert ist, und setzt
+        abgebrochene Jobs (running mit abgelaufener Lease) sowie fehlgeschlagene Jobs ohne
+        dauerhaften HTTP-Fehler zurück auf queued. Jobs mit gültiger Lease gehören einem
+        anderen Prozess und bleiben unverändert.
+
+        :return: Anzahl der zurückgesetzten Jobs
+        """
+        table = DownloadJob.__table__
+        now = datetime.now()
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.update()
+                .where(table.c.state.in_(['queued', 'failed', 'skipped']))
+                .where(exists().where(Downloaded.source_id == table.c.source_id))
+                .values(state='done', updated=now)
+            )
+            result = connection.execute(
+                table.update()
+                .where(or_(
+                    and_(table.c.state == 'running', or_(table.c.updated.is_(None), table.c.updated < now - lease)),
+                    and_(table.c.state == 'failed', or_(table.c.http_status.is_(None), table.c.http_status.notin_(permanent))),
+                ))
+                .values(state='queued', owner=None, updated=now)
+            )
+            return result.rowcount
+
+    def get_download_jobs(self, states=('queued',)):
+        """
+        Gibt die Jobs mit den angegebenen Zuständen in der Reihenfolge ihrer Anlage zurück,
+        ohne Jobs für bereits heruntergeladene Quellen.
+        """
+        query = (
+            select(DownloadJob)
+            .where(DownloadJob.state.in_(states))
+            .where(~exists().where(Downloaded.source_id == DownloadJob.source_id))
+            .order_by(DownloadJob.id)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).mappings()
+            return [dict(row, meta=json.loads(row['meta'] or '{}'), variants=json.loads(row['variants'] or '[]')) for row in rows]
+
+    def skip_download_jobs(self, source_ids):
+        """
+        Markiert wartende Jobs, die die Planung nicht ausgewählt hat, als skipped. Sie laufen erst
+        wieder, wenn eine spätere Suche dieselbe Quelle erneut einreiht.
+        """
+        source_ids = list(source_ids)
+        if not source_ids:
+            return
+        table = DownloadJob.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.update()
+                .where(table.c.source_id.in_(source_ids), table.c.state == 'queued')
+                .values(state='skipped', updated=datetime.now())
+            )
+
+    def claim_download_job(self, source_id, owner, lease=JOB_LEASE):
+        """
+        Übernimmt einen wartenden Job (oder einen laufenden mit abgelaufener Lease) für owner.
+
+        :return: True, wenn der Job jetzt owner gehört
+        """
+        table = DownloadJob.__table__
+        now = datetime.now()
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                table.update()
+                .where(table.c.source_id == source_id)
+                .where(or_(
+                    table.c.state == 'queued',
+                    and_(table.c.state == 'running', or_(table.c.owner == owner, table.c.updated.is_(None), table.c.updated < now - lease)),
+                ))
+                .values(state='running', owner=owner, updated=now)
+            )
+            return result.rowcount == 1
+
+    def renew_download_job(self, source_id, owner):
+        with self.engine.begin() as connection:
+            connection.execute(
+                DownloadJob.__table__.update()
+                .where(DownloadJob.source_id == source_id, DownloadJob.owner == owner)
+                .values(updated=datetime.now())
+            )
+
+    @contextmanager
+    def download_job_lease(self, source_id, owner=None, lease=JOB_LEASE):
+        """
+        Übernimmt den Job für die Dauer des Blocks und erneuert die Lease im Hintergrund.
+        Liefert False, wenn ein anderer Prozess den Job gerade lädt.
+        """
+        owner = owner or job_owner()
+        if not self.claim_download_job(source_id, owner, lease=lease):
+            yield False
+            return
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(lease.total_seconds() / 3):
+                self.renew_download_job(source_id, owner)
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield True
+        finally:
+            stop.set()
+            thread.join()
+
+    def update_download_job(self, source_id, **values):
+        values['updated'] = datetime.now()
+        with self.engine.begin() as connection:
+            connection.execute(DownloadJob.__table__.update().where(DownloadJob.source_id == source_id).values(**values))
+
+    def save_download_metrics(self, transfers):
+        if not transfers:
+            return
+        with self.engine.begin() as connection:
+            connection.execute(DownloadMetric.__table__.insert(), transfers)
+
+    def get_url_heads(self, urls, max_age=None, chunk_size=500):
+        """
+        Gibt die gecachten HEAD-Ergebnisse der URLs zurück, die nicht älter als max_age sind.
+        """
+        urls = list(dict.fromkeys(urls))
+        heads = {}
+        with self.engine.connect() as connection:
+            for i in range(0, len(urls), chunk_size):
+                query = select(UrlHead).where(UrlHead.url.in_(urls[i:i + chunk_size]))
+                if max_age is not None:
+                    query = query.where(UrlHead.checked_at >= datetime.now() - max_age)
+                heads.update((row['url'], dict(row)) for row in connection.execute(query).mappings())
+        return heads
+
+    def save_url_heads(self, heads):
+        if not heads:
+            return
+        stmt = sqlite_insert(UrlHead.__table__)
+        stmt = stmt.on_conflict_do_update(index_elements=['url'], set_={column: stmt.excluded[column] for column in ['status', 'content_length', 'accept_ranges', 'last_modified', 'checked_at']})
+        with self.engine.begin() as connection:
+            connection.execute(stmt, heads)
+
     def add_metadata(self, metadata_list):
         with self.get_session() as session:
             for metadata_data in metadata_list:
@@ -479,69 +1289,197 @@ class DataBaseManager:
             else:
                 return None
 
-    def get_source_on_id(self, list_of_id, quality='M', only_not_downloaded=True, website=False, fileformat='mp4'):
-        quality_column = {
-            'H': 'url_video_hd',
-            'M': 'url_video',
-            'L': 'url_video_low',
-        }
+    def get_known_source_ids(self, list_of_id, chunk_size=500):
+        """
+        Gibt die Teilmenge der übergebenen IDs zurück, die bereits in der Tabelle 'source' stehen.
+        """
+        list_of_id = list(dict.fromkeys(list_of_id))
+        known = set()
+        with self.engine.connect() as connection:
+            for i in range(0, len(list_of_id), chunk_size):
+                chunk = list_of_id[i:i + chunk_size]
+                rows = connection.execute(select(Source.id).where(Source.id.in_(chunk)))
+                known.update(row[0] for row in rows)
+        return known
+
+    def get_source_ids_by_url(self, urls, chunk_size=500):
+        """
+        Gibt die IDs bereits gespeicherter Quellen zu Video-URLs zurück.
+
+        :return: Ein Dictionary url_video -> ID
+        """
+        urls = list(dict.fromkeys(k for k in urls if k))
+        ids = {}
+        with self.engine.connect() as connection:
+            for i in range(0, len(urls), chunk_size):
+                rows = connection.execute(select(Source.url_video, Source.id).where(Source.url_video.in_(urls[i:i + chunk_size])))
+                ids.update((url, source_id) for url, source_id in rows)
+        return ids
 
+    def get_sync_state(self, query_key):
+        """
+        Liefert die Hochwassermarke (neuester Zeitstempel und ID) einer Suchanfrage oder None.
+        """
         with self.get_session() as session:
-            # Basisabfrage für Quellen
-            query = (
-                session.query(Source)
-                .filter(Source.id.in_(list_of_id))
-            )
-    
-            if only_not_downloaded:
-                subquery = (
-                    session.query(Downloaded.source_id)
-                    .filter(Downloaded.source_id.in_(list_of_id))
+            state = session.query(SyncState).filter_by(query_key=query_key).first()
+            if state is None or state.newest_timestamp is None:
+                return None
+            return {'timestamp': state.newest_timestamp, 'id': state.newest_id, 'synced_at': state.synced_at}
+
+    def update_sync_state(self, query_key, newest_timestamp=None, newest_id=None, source_ids=()):
+        """
+        Verschiebt die Hochwassermarke einer Suchanfrage nach vorne und merkt sich,
+        welche Quellen zu dieser Suchanfrage gehören.
+        """
+        with self.engine.begin() as connection:
+            state = connection.execute(select(SyncState).where(SyncState.query_key == query_key)).first()
+            values = {'synced_at': datetime.now()}
+            if newest_timestamp is not None and (state is None or state.newest_timestamp is None or newest_timestamp >= state.newest_timestamp):
+                values.update({'newest_timestamp': newest_timestamp, 'newest_id': newest_id})
+            if state is None:
+                connection.execute(SyncState.__table__.insert().values(query_key=query_key, **values))
+            else:
+                connection.execute(SyncState.__table__.update().where(SyncState.query_key == query_key).values(**values))
+
+            source_ids = list(dict.fromkeys(source_ids))
+            if source_ids:
+                connection.execute(
+                    QuerySource.__table__.insert().prefix_with('OR IGNORE'),
+                    [{'query_key': query_key, 'source_id': source_id} for source_id in source_ids],
                 )
-                query = query.filter(~Source.id.in_(subquery))
-                
-            # Filtern nach dem passenden Dateiformat
-            query = query.filter(Source.fileformat == fileformat)
-    
-            sources = query.all()
 
-            result = []
+    def get_query_source_ids(self, query_key):
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(QuerySource.source_id).where(QuerySource.query_key == query_key))
+            return [row[0] for row in rows]
 
-            for source in sources:
-                # Verwende die getattr-Methode, um die richtige Spalte basierend auf der Qualität zu erhalten
-                link_column = quality_column.get(quality, None)
+    @staticmethod
+    def _fts_phrase(term):
+        # Präfixsuche auf das letzte Token: 'Film' findet auch 'Filme'
+        return '"' + term.replace('"', '""') + '"*'
 
-                if link_column:
-                    link = getattr(source, link_column, None)
-                else:
-                    link = getattr(source, quality_column.get('M'), None)
+    def search_sources(self, search=(), channel=(), exclude=None, limit=None):
+        """
+        Durchsucht die lokale Tabelle 'source' wie die API: Suchbegriffe werden in title und topic
+        gesucht, Sender in channel; Begriffe einer Gruppe sind ODER-verknüpft, die Gruppen UND-verknüpft.
+        Quellen, deren Titel von exclude (ExclusionMatcher) erfasst werden, werden in derselben
+        Abfrage ausgelassen.
 
-                # Größe in Megabytes umrechnen
-                try:
-                    size_mb = source.size / (1024 * 1024)
-                except:
-                    size_mb = 0
+        Der FTS5-Index findet Begriffe nur am Anfang eines Tokens ('Film' in 'Filme', nicht in
+        'Spielfilm'). Findet er nichts, wird wie bei der API als Teilzeichenkette (LIKE) gesucht.
 
-                data = {
-                    'id': source.id,
-                    'title': source.title,
-                    'description': source.description,
-                    'topic': source.topic,
-                    'link': link,
-                    'duration': source.duration,
-                    'timestamp': source.timestamp,
-                    'size': size_mb,
-                    'channel' : source.channel,
-                    'format' : source.fileformat,
-                    'imdb' : source.imdb_id,
-                    'imdb_parsed' : source.imdb_parsed==True,
-                }
-                if website:
-                    data['website'] = source.url_website
+        :return: Liste von Source-IDs, nach Relevanz sortiert (bm25), bzw. nach Zeitstempel bei LIKE
+        """
+        search = [k.strip() for k in search if k and k.strip()]
+        channel = [k.strip() for k in channel if k and k.strip()]
+
+        base = select(Source.id)
+        if exclude:
+            base = base.where(exclude.sql_clause(Source.title))
+
+        queries = []
+        if self.fts_enabled and (search or channel):
+            groups = []
+            if search:
+                groups.append('{title topic} : (' + ' OR '.join(self._fts_phrase(k) for k in search) + ')')
+            if channel:
+                groups.append('channel : (' + ' OR '.join(self._fts_phrase(k) for k in channel) + ')')
+
+            source_fts = sql_table('source_fts', sql_column('rowid'))
+            queries.append(
+                base.select_from(source_fts.join(Source.__table__, Source.fts_rowid == source_fts.c.rowid))
+                .where(text('source_fts MATCH :match').bindparams(match=' AND '.join(f'({k})' for k in groups)))
+                .order_by(text('bm25(source_fts, 10.0, 5.0, 1.0, 1.0)'))
+            )
+
+        query = base
+        if search:
+            query = query.where(or_(*[or_(Source.title.contains(k, autoescape=True), Source.topic.contains(k, autoescape=True)) for k in search]))
+        if channel:
+            query = query.where(or_(*[Source.channel.contains(k, autoescape=True) for k in channel]))
+        queries.append(query.order_by(Source.timestamp.desc()))
+
+        with self.engine.connect() as connection:
+            for query in queries:
+                ids = list(connection.execute(query.limit(limit) if limit else query).scalars())
+                if ids:
+                    break
+            return ids
+
+    def _source_on_id_statement(self, list_of_id, quality='M', only_not_downloaded=True, website=False, fileformat='mp4', exclude=None, variants=False):
+        """
+        SELECT nur der benötigten Spalten; bereits heruntergeladene Quellen werden per Anti-Join
+        (LEFT JOIN downloaded ... IS NULL) ausgeschlossen, ausgeschlossene Titel per exclude.
+        Mit variants=True kommen die URLs aller Qualitäten als link_H, link_M und link_L dazu.
+        """
+        link_column = Source.__table__.c[QUALITY_COLUMNS.get(quality, QUALITY_COLUMNS['M'])]
+
+        columns = [
+            Source.id,
+            Source.title,
+            Source.description,
+            Source.topic,
+            link_column.label('link'),
+            Source.duration,
+            Source.timestamp,
+            Source.size,
+            Source.channel,
+            Source.fileformat.label('format'),
+            Source.imdb_id.label('imdb'),
+            Source.imdb_parsed,
+        ]
+        if website:
+            columns.append(Source.url_website.label('website'))
+        if variants:
+            columns.extend(Source.__table__.c[name].label(f'link_{key}') for key, name in QUALITY_COLUMNS.items())
+
+        query = select(*columns).where(Source.id.in_(list_of_id), Source.fileformat == fileformat)
+
+        if only_not_downloaded:
+            query = query.outerjoin(Downloaded, Downloaded.source_id == Source.id).where(Downloaded.source_id.is_(None))
+
+        if exclude:
+            query = query.where(exclude.sql_clause(Source.title))
+
+        return query
+
+    def _iter_source_rows(self, list_of_id, chunk_size=500, **kwargs):
+        """
+        Führt die Abfrage blockweise über die IDs aus (unter dem Limit für gebundene Variablen)
+        und liefert die Zeilen direkt vom Cursor.
+        """
+        list_of_id = list(dict.fromkeys(list_of_id))
+        with self.engine.connect() as connection:
+            for i in range(0, len(list_of_id), chunk_size):
+                yield from connection.execute(self._source_on_id_statement(list_of_id[i:i + chunk_size], **kwargs))
+
+    def iter_source_on_id(self, list_of_id, chunk_size=500, **kwargs):
+        """
+        Wie get_source_on_id, liefert die Quellen aber einzeln als Generator.
+        """
+        for row in self._iter_source_rows(list_of_id, chunk_size=chunk_size, **kwargs):
+            data = row._asdict()
+            # Größe in Megabytes umrechnen
+            data['size'] = data['size'] / (1024 * 1024) if data['size'] else 0
+            data['imdb_parsed'] = data['imdb_parsed'] == True
+            yield data
 
-                result.append(data)
+    def get_source_on_id(self, list_of_id, quality='M', only_not_downloaded=True, website=False, fileformat='mp4'):
+        return list(self.iter_source_on_id(list_of_id, quality=quality, only_not_downloaded=only_not_downloaded, website=website, fileformat=fileformat))
+
+    def get_source_frame_on_id(self, list_of_id, quality='M', only_not_downloaded=True, website=False, fileformat='mp4', exclude=None, variants=False, chunk_size=500):
+        """
+        Wie get_source_on_id, baut aber direkt ein DataFrame aus den Zeilen des Cursors
+        (ohne ORM-Objekte und Zwischen-Dictionaries).
+        """
+        kwargs = {'quality': quality, 'only_not_downloaded': only_not_downloaded, 'website': website, 'fileformat': fileformat, 'exclude': exclude, 'variants': variants}
+        columns = list(self._source_on_id_statement([], **kwargs).selected_columns.keys())
+        DF_sources = pd.DataFrame.from_records(list(self._iter_source_rows(list_of_id, chunk_size=chunk_size, **kwargs)), columns=columns)
 
-            return result
+        # Größe in Megabytes umrechnen
+        DF_sources['size'] = pd.to_numeric(DF_sources['size']).fillna(0) / (1024 * 1024)
+        DF_sources['imdb_parsed'] = DF_sources['imdb_parsed'] == True
+        return DF_sources
 
     def mark_as_downloaded(self, list_of_id):
         with self.get_session() as session:
@@ -570,6 +1508,102 @@ class DataBaseManager:
 
             return downloaded_item is not None
 
+    @contextmanager
+    def _capture_selects(self):
+        """
+        Sammelt alle SELECT-Statements (mit Parametern), die innerhalb des Blocks ausgeführt werden.
+        """
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                captured.append((statement, parameters))
+
+        event.listen(self.engine, 'before_cursor_execute', capture)
+        try:
+            yield captured
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', capture)
+
+    def _query_probes(self):
+        """
+        Beispielaufrufe aller lesenden Abfragen, deren Anfragepläne geprüft werden sollen.
+        """
+        with self.engine.connect() as connection:
+            source_id = connection.execute(select(Source.id).limit(1)).scalar() or ''
+            imdb_id = connection.execute(select(IMDBEntry.imdb_id).limit(1)).scalar() or ''
+            query_key = connection.execute(select(SyncState.query_key).limit(1)).scalar() or ''
+
+        return {
+            'is_downloaded': lambda: self.is_downloaded(source_id),
+            'get_metadata': lambda: self.get_metadata(source_id),
+            'get_source_on_id': lambda: self.get_source_on_id([source_id]),
+            'get_known_source_ids': lambda: self.get_known_source_ids([source_id]),
+            'get_source_ids_by_url': lambda: self.get_source_ids_by_url(['probe']),
+            'get_sync_state': lambda: self.get_sync_state(query_key),
+            'get_query_source_ids': lambda: self.get_query_source_ids(query_key),
+            'search_sources': lambda: self.search_sources(search=['spielfilm'], channel=['zdf'], exclude=ExclusionMatcher(EXCLUDED_TAGS), limit=1),
+            'get_imdb_entry_over': lambda: self.get_imdb_entry_over(score=10),
+            'get_ratings_for_imdb_ids': lambda: self.get_ratings_for_imdb_ids([imdb_id]),
+            '_get_imdb_id_to_reparse': lambda: self._get_imdb_id_to_reparse(),
+            '_get_downloaded': lambda: self._get_downloaded(within=1),
+            'get_download_jobs': lambda: self.get_download_jobs(),
+            'get_url_heads': lambda: self.get_url_heads([''], max_age=timedelta(hours=1)),
+            'get_imdb_lookup': lambda: self.get_imdb_lookup('probe', 2000),
+            'match_imdb_dataset': lambda: self.match_imdb_dataset([{'title': 'probe', 'year': 2000}]),
+        }
+
+    @staticmethod
+    def _is_full_scan(line):
+        """
+        Eine Planzeile ist ein Full-Scan, wenn sie eine Tabelle oder einen vollständigen Index
+        durchläuft. Scans über partielle Indizes lesen nur die passenden Zeilen.
+        """
+        if not line.startswith('SCAN ') or line.startswith('SCAN CONSTANT ROW'):
+            return False
+        # Zwischenergebnisse und die Kandidatenliste aus VALUES (match_imdb_dataset) sind keine Tabellen
+        if line.startswith(('SCAN (subquery-', 'SCAN imdb_candidate')):
+            return False
+        # FTS5-Abfragen mit MATCH erscheinen als 'SCAN ... VIRTUAL TABLE INDEX 0:M...'
+        if ' VIRTUAL TABLE INDEX ' in line and ':M' in line:
+            return False
+        partial = [index.name for table in Base.metadata.tables.values() for index in table.indexes if index.dialect_options['sqlite']['where'] is not None]
+        return not any(f'INDEX {name}' in line for name in partial)
+
+    def explain_queries(self):
+        """
+        Gibt für jede Abfrage des DataBaseManager die ausgeführten SELECTs mit ihrem
+        EXPLAIN QUERY PLAN zurück.
+
+        :return: Ein Dictionary Abfragename -> Liste von {'sql', 'plan', 'full_scan'}
+        """
+        plans = {}
+        for name, probe in self._query_probes().items():
+            with self._capture_selects() as captured:
+                try:
+                    probe()
+                except Exception as e:
+                    print(f"Error running query '{name}': {e}")
+
+            plans[name] = []
+            with self.engine.connect() as connection:
+                for statement, parameters in captured:
+                    plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters or ()))]
+                    plans[name].append({
+                        'sql': ' '.join(statement.split()),
+                        'plan': plan,
+                        'full_scan': any(self._is_full_scan(line) for line in plan),
+                    })
+        return plans
+
+    def print_query_plans(self):
+        for name, statements in self.explain_queries().items():
+            print(f"== {name}")
+            for statement in statements:
+                print(f"   {statement['sql']}")
+                for line in statement['plan']:
+                    marker = '   <-- full scan' if self._is_full_scan(line) else ''
+                    print(f"     {line}{marker}")
         
 if __name__ == "__main__":
     example_data = [{
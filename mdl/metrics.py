@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+download metrics
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+DIMENSIONS = ['host', 'channel', 'quality']
+
+def _write_atomic(path, content):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class DownloadMetrics:
+    """
+    Sammelt Kennzahlen je Download (alle Versuche eines Jobs zusammen): Zeit bis zum ersten
+    Byte, mittlere und höchste Rate, Wiederholungen und fortgesetzte Bytes. Die Summen je Host,
+    Sender und Qualität werden als JSON und als Datei für den Textfile-Collector des Prometheus
+    node_exporter geschrieben.
+    """
+    def __init__(self):
+        self.transfers = []
+        self.lock = threading.Lock()
+
+    def record(self, results, source_id=None, host=None, channel=None, quality=None):
+        """
+        :param results: Ergebnisse der Download-Engine für alle Versuche eines Downloads
+        """
+        if not results:
+            return None
+        duration = sum(k['duration'] or 0 for k in results)
+        received = sum(k['bytes'] or 0 for k in results)
+        ttfb = [k['ttfb'] for k in results if k.get('ttfb') is not None]
+        peak = [k['peak'] for k in results if k.get('peak')]
+        transfer = {
+            'source_id': source_id,
+            'host': host or 'unknown',
+            'channel': channel or 'unknown',
+            'quality': quality or 'unknown',
+            'status': results[-1]['status'],
+            'success': bool(results[-1]['success']),
+            'bytes': received,
+            'resumed': results[0]['resumed'] or 0,
+            'duration': duration,
+            'ttfb': ttfb[0] if ttfb else None,
+            'avg_throughput': received / duration if duration > 0 else None,
+            'peak_throughput': max(peak) if peak else None,
+            'retries': len(results) - 1,
+            'finished': datetime.now(),
+        }
+        with self.lock:
+            self.transfers.append(transfer)
+        return transfer
+
+    def aggregate(self, dimensions=DIMENSIONS):
+        """
+        :return: Ein Dictionary Dimension -> Wert -> Summen
+        """
+        summary = {}
+        with self.lock:
+            transfers = list(self.transfers)
+        for dimension in dimensions:
+            groups = summary.setdefault(dimension, {})
+            for transfer in transfers:
+                group = groups.setdefault(transfer[dimension], {
+                    'transfers': 0, 'failures': 0, 'bytes': 0, 'seconds': 0.0, 'retries': 0, 'bytes_resumed': 0,
+                    'ttfb_seconds': [], 'peak_throughput': None,
+                })
+                group['transfers'] += 1
+                group['failures'] += 0 if transfer['success'] else 1
+                group['bytes'] += transfer['bytes']
+                group['seconds'] += transfer['duration']
+                group['retries'] += transfer['retries']
+                group['bytes_resumed'] += transfer['resumed']
+                if transfer['ttfb'] is not None:
+                    group['ttfb_seconds'].append(transfer['ttfb'])
+                if transfer['peak_throughput'] is not None:
+                    group['peak_throughput'] = max(group['peak_throughput'] or 0, transfer['peak_throughput'])
+
+            for group in groups.values():
+                ttfb = group.pop('ttfb_seconds')
+                group['ttfb_avg_seconds'] = sum(ttfb) / len(ttfb) if ttfb else None
+                group['avg_throughput'] = group['bytes'] / group['seconds'] if group['seconds'] > 0 else None
+        return summary
+
+    def write_json(self, path):
+        summary = {'generated': datetime.now().isoformat(timespec='seconds'), 'transfers': len(self.transfers), 'by': self.aggregate()}
+        _write_atomic(path, json.dumps(summary, indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path):
+        """
+        Eine Metrikfamilie je Kennzahl und Dimension (z.B. mdl_download_bytes_by_host),
+        damit jede Familie genau ein Label hat. Alle Werte gelten nur für diesen Lauf und
+        beginnen beim nächsten wieder bei 0, deshalb sind sie Gauges und keine Counter.
+
+        Die Summen ohne Label und mdl_run_timestamp_seconds werden immer geschrieben, auch
+        nach einem Lauf ohne Downloads (dann mit 0), damit keine Werte eines früheren Laufs
+        stehen bleiben.
+        """
+        metrics = [
+            ('transfers', '', 'Downloads in this run', 'transfers'),
+            ('failures', '', 'Failed downloads in this run', 'failures'),
+            ('bytes', '', 'Bytes received in this run', 'bytes'),
+            ('seconds', '', 'Seconds spent transferring in this run', 'seconds'),
+            ('retries', '', 'Retried attempts in this run', 'retries'),
+            ('resumed_bytes', '', 'Bytes already on disk when a download started', 'bytes_resumed'),
+            ('throughput', '_bytes_per_second', 'Average throughput', 'avg_throughput'),
+            ('peak_throughput', '_bytes_per_second', 'Highest throughput over one second', 'peak_throughput'),
+            ('ttfb', '_seconds', 'Average time to first byte', 'ttfb_avg_seconds'),
+        ]
+        with self.lock:
+            transfers = list(self.transfers)
+        lines = [
+            '# HELP mdl_run_timestamp_seconds Time of the run that wrote these metrics',
+            '# TYPE mdl_run_timestamp_seconds gauge',
+            f'mdl_run_timestamp_seconds {time.time():.3f}',
+        ]
+        totals = {
+            'transfers': len(transfers),
+            'failures': sum(0 if k['success'] else 1 for k in transfers),
+            'bytes': sum(k['bytes'] for k in transfers),
+            'seconds': sum(k['duration'] for k in transfers),
+            'retries': sum(k['retries'] for k in transfers),
+            'bytes_resumed': sum(k['resumed'] for k in transfers),
+        }
+        for name, unit, description, key in metrics:
+            if key in totals:
+                family = f'mdl_download_{name}{unit}'
+                lines += [f'# HELP {family} {description}', f'# TYPE {family} gauge', f'{family} {totals[key]}']
+
+        summary = self.aggregate()
+        for dimension, groups in summary.items():
+            for name, unit, description, key in metrics:
+                family = f'mdl_download_{name}_by_{dimension}{unit}'
+                lines.append(f'# HELP {family} {description} by {dimension}')
+                lines.append(f'# TYPE {family} gauge')
+                for value, group in sorted(groups.items()):
+                    if group[key] is not None:
+                        lines.append(f'{family}{{{dimension}="{_label(value)}"}} {group[key]}')
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+    def export(self, directory):
+        """
+        Schreibt mdl_metrics.json und mdl.prom (atomar ersetzt) in directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.write_json(os.path.join(directory, 'mdl_metrics.json'))
+        self.write_prometheus(os.path.join(directory, 'mdl.prom'))
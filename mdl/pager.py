@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pipelined pagination for the mediathekviewweb query api
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://mediathekviewweb.de/api/query'
+
+def pooled_session(pool_size=10):
+    """
+    Erzeugt eine requests.Session, deren Verbindungspool mindestens pool_size
+    gleichzeitige Verbindungen pro Host offen halten kann.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class QueryPager:
+    """
+    Hält bis zu `concurrency` offset-Anfragen gleichzeitig offen und liefert
+    die Seiten trotzdem in ihrer Reihenfolge. Die erste leere (oder
+    fehlerhafte) Seite beendet das Paging, ebenso eine kurze Seite (weniger
+    als page_size Ergebnisse) nach ihrer Ausgabe; alle späteren Anfragen
+    werden verworfen. Ein Fehler wird in `error` festgehalten, das Ergebnis ist
+    dann unvollständig.
+
+    Mit `initial` startet das Paging mit weniger parallelen Anfragen und
+    verdoppelt das Fenster nach jeder vollen Seite bis `concurrency`
+    (sinnvoll, wenn der Aufrufer meist nach der ersten Seite abbricht).
+    """
+    def __init__(self, queries, page_size=50, concurrency=4, session=None, url=API_URL, timeout=30, initial=None, **params):
+        self.queries = queries
+        self.page_size = max(int(page_size), 1)
+        self.concurrency = max(int(concurrency), 1)
+        self.initial = min(max(int(initial), 1), self.concurrency) if initial else self.concurrency
+        self.session = session or pooled_session(self.concurrency)
+        self.url = url
+        self.timeout = timeout
+        self.params = {
+                        'sortBy': 'timestamp',
+                        'sortOrder': 'desc',
+                        'future': 'true',
+                        'duration_min': 20,
+                        'duration_max': 10000,
+                        }
+        self.params.update(params)
+        self.requests = 0
+        self.error = None
+
+    def _payload(self, offset):
+        data = dict(self.params)
+        data.update({'queries': self.queries, 'offset': offset, 'size': self.page_size})
+        return data
+
+    def fetch_page(self, offset):
+        self.requests += 1
+        response = self.session.post(self.url, json=self._payload(offset), headers={'content-type': 'text/plain'}, timeout=self.timeout)
+        return response.json()['result']['results']
+
+    def pages(self):
+        """
+        Generator über die Ergebnisseiten in offset-Reihenfolge.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = deque()
+            next_offset = 0
+            window = self.initial
+
+            def submit():
+                nonlocal next_offset
+                in_flight.append((next_offset, executor.submit(self.fetch_page, next_offset)))
+                next_offset += self.page_size
+
+            for _ in range(window):
+                submit()
+
+            try:
+                while in_flight:
+                    offset, future = in_flight.popleft()
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        print(f"Error fetching page at offset {offset}: {e}")
+                        self.error = e
+                        break
+
+                    if len(page) == 0:
+                        break
+
+                    yield page
+
+                    if len(page) < self.page_size:
+                        break
+
+                    window = min(window * 2, self.concurrency)
+                    while len(in_flight) < window:
+                        submit()
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
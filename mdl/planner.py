@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disk space planning for the download queue
+"""
+import json
+import math
+import os
+import threading
+
+STRATEGIES = ['order', 'count', 'rating']
+
+def free_bytes(path):
+    disk = os.statvfs(path)
+    return disk.f_bsize * disk.f_bavail
+
+def bytes_on_disk(partial):
+    """
+    Bereits geladene Bytes einer .partial-Datei. Segmentierte Downloads legen die Datei in voller
+    Länge (sparse) an, dort zählt der Fortschritt aus der .state-Datei.
+    """
+    try:
+        with open(f'{partial}.state') as f:
+            return sum(done for _, _, done in json.load(f)['segments'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    try:
+        return os.path.getsize(partial)
+    except OSError:
+        return 0
+
+class SpacePlanner:
+    """
+    Plant den Platzbedarf einer Download-Warteschlange.
+
+    Jeder Job ist ein Dict mit 'size' (Bytes, None wenn unbekannt), 'partial' (Pfad der
+    .partial-Datei) und optional 'rating'. Bereits geladene Bytes werden abgezogen. Während
+    der Downloads hält reserve() den restlichen Bedarf laufender Jobs fest, damit parallele
+    Jobs nicht denselben freien Platz einplanen.
+    """
+    def __init__(self, path, min_free=0):
+        self.path = path
+        self.min_free = min_free
+        self.active = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def need(job):
+        """
+        Noch zu ladende Bytes eines Jobs (0 bei unbekannter Größe).
+        """
+        size = job.get('size')
+        if size is None or (isinstance(size, float) and math.isnan(size)):
+            return 0
+        return max(int(size) - bytes_on_disk(job['partial']), 0)
+
+    def budget(self):
+        return free_bytes(self.path) - self.min_free
+
+    def plan(self, jobs, strategy='order'):
+        """
+        Wählt die Jobs, die gemeinsam in den freien Platz passen.
+
+        order:  Warteschlange der Reihe nach, was nicht passt wird übersprungen
+        count:  möglichst viele Jobs (kleinster Bedarf zuerst)
+        rating: maximale Summe der Bewertungen (0/1-Rucksack)
+
+        :return: (ausgewählte Jobs, übersprungene Jobs), jeweils in der ursprünglichen Reihenfolge
+        """
+        budget = self.budget()
+        needs = [self.need(job) for job in jobs]
+
+        if strategy == 'rating':
+            ratings = [float(job.get('rating') or 0) for job in jobs]
+            chosen = self._knapsack(needs, [k if math.isfinite(k) else 0 for k in ratings], budget)
+        else:
+            order = range(len(jobs))
+            if strategy == 'count':
+                order = sorted(order, key=lambda k: needs[k])
+            chosen, used = set(), 0
+            for k in order:
+                if used + needs[k] <= budget:
+                    chosen.add(k)
+                    used += needs[k]
+
+        for job, need in zip(jobs, needs):
+            job['need'] = need
+        selected = [job for k, job in enumerate(jobs) if k in chosen]
+        skipped = [job for k, job in enumerate(jobs) if k not in chosen]
+        return selected, skipped
+
+    @staticmethod
+    def _knapsack(needs, values, budget, resolution=2000):
+        """
+        0/1-Rucksack über den Bedarf, auf `resolution` Kapazitätsstufen gerundet (aufgerundet,
+        die Auswahl passt also sicher).
+        """
+        if budget < 0:
+            return {k for k, need in enumerate(needs) if need == 0}
+        unit = max(budget / resolution, 1)
+        capacity = int(budget // unit)
+        weights = [math.ceil(need / unit) for need in needs]
+
+        best = [0.0] * (capacity + 1)
+        keep = []
+        for k, (weight, value) in enumerate(zip(weights, values)):
+            taken = [False] * (capacity + 1)
+            if weight <= capacity:
+                for c in range(capacity, weight - 1, -1):
+                    # kleiner Bonus pro Job: freier Platz wird auch mit unbewerteten Jobs gefüllt
+                    candidate = best[c - weight] + value + 1e-6
+                    if candidate > best[c]:
+                        best[c] = candidate
+                        taken[c] = True
+            keep.append(taken)
+
+        chosen, c = set(), capacity
+        for k in range(len(needs) - 1, -1, -1):
+            if keep[k][c]:
+                chosen.add(k)
+                c -= weights[k]
+        return chosen
+
+    def print_plan(self, selected, skipped):
+        GB = 1024 ** 3
+        print("Download plan: {:d} of {:d} sources, {:.1f}GB needed, {:.1f}GB available above --free".format(
+            len(selected), len(selected) + len(skipped),
+            sum(job['need'] for job in selected) / GB, max(self.budget(), 0) / GB))
+        for job in skipped:
+            print("Not enough disk space, skipping: {:} ({:.1f}GB)".format(job.get('name'), job['need'] / GB))
+
+    def outstanding(self):
+        """
+        Restbedarf aller laufenden Jobs.
+        """
+        return sum(self.need(job) for job in self.active.values())
+
+    def reserve(self, key, job):
+        """
+        Prüft unmittelbar vor dem Start den tatsächlich freien Platz abzüglich des Restbedarfs
+        laufender Jobs und reserviert den Bedarf dieses Jobs. False, wenn er nicht mehr passt.
+        """
+        with self.lock:
+            if self.budget() - self.outstanding() - self.need(job) < 0:
+                return False
+            self.active[key] = job
+            return True
+
+    def resize(self, key, job, size):
+        """
+        Ändert die Größe eines reservierten Jobs (z.B. nach dem Wechsel auf eine andere Qualität).
+        False, wenn der neue Bedarf nicht mehr in den freien Platz passt; der Job bleibt dann
+        unverändert.
+        """
+        with self.lock:
+            others = sum(self.need(k) for name, k in self.active.items() if name != key)
+            if self.budget() - others - self.need(dict(job, size=size)) < 0:
+                return False
+            job['size'] = size
+            self.active[key] = job
+            return True
+
+    def release(self, key):
+        with self.lock:
+            self.active.pop(key, None)
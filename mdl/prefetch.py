@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HEAD prefetch of download links
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import requests
+
+# import modules
+modules = [
+    "mdl.pager import pooled_session",
+]
+
+for module in modules:
+    try:
+        exec(f"from {module}")
+    except:
+        exec(f"from {module.split('.')[-1]}")
+
+##############
+
+class HeadPrefetcher:
+    """
+    Fragt Content-Length, Accept-Ranges und Last-Modified vieler Links parallel per HEAD ab
+    (gepoolte Verbindungen) und cached die Antworten in der Tabelle url_head. Einträge, die
+    jünger als ttl sind, werden nicht erneut abgefragt.
+    """
+    def __init__(self, db, ttl=timedelta(hours=24), concurrency=16, timeout=10, session=None):
+        self.db = db
+        self.ttl = ttl
+        self.concurrency = max(int(concurrency), 1)
+        self.timeout = timeout
+        self.session = session or pooled_session(self.concurrency)
+        self.requests = 0
+
+    def _head(self, url):
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        length = response.headers.get('Content-Length')
+        return {
+                'url': url,
+                'status': response.status_code,
+                'content_length': int(length) if response.ok and length and length.isdigit() else None,
+                'accept_ranges': response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked_at': datetime.now(),
+                }
+
+    def lookup(self, urls):
+        """
+        :return: Ein Dictionary URL -> HEAD-Ergebnis (fehlt bei Netzwerkfehlern)
+        """
+        urls = list(dict.fromkeys(k for k in urls if isinstance(k, str) and k))
+        heads = self.db.get_url_heads(urls, max_age=self.ttl)
+        missing = [url for url in urls if url not in heads]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(missing))) as executor:
+                fetched = [k for k in executor.map(self._head, missing) if k is not None]
+            self.requests += len(missing)
+            self.db.save_url_heads(fetched)
+            heads.update((k['url'], k) for k in fetched)
+
+        return heads
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+concurrent download scheduler
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+class TokenBucket:
+    """
+    Globales Bandbreitenlimit in Bytes pro Sekunde, geteilt von allen Download-Threads.
+    rate <= 0 bedeutet unbegrenzt.
+    """
+    def __init__(self, rate, burst=1.0):
+        self.rate = float(rate or 0)
+        self.capacity = self.rate * burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Schulden sind erlaubt, der Aufrufer wartet sie ab
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class DownloadScheduler:
+    """
+    Führt Jobs mit `jobs` parallelen Threads aus, höchstens `per_host` gleichzeitig pro Hostname.
+    Die Hosts werden reihum bedient, innerhalb eines Hosts bleibt die Reihenfolge erhalten.
+    """
+    def __init__(self, jobs=1, per_host=2):
+        self.jobs = max(int(jobs), 1)
+        self.per_host = max(int(per_host), 1)
+        self.queues = OrderedDict()
+        self.active = {}
+        self.results = []
+        self.condition = threading.Condition()
+
+    def add(self, host, function, **kwargs):
+        index = len(self.results)
+        self.results.append(None)
+        self.queues.setdefault(host, deque()).append((index, function, kwargs))
+        self.active.setdefault(host, 0)
+        return index
+
+    def _next_job(self):
+        """
+        Nächster Job des ersten Hosts (in Rotation) mit freier Kapazität, sonst None.
+        """
+        for host in list(self.queues):
+            if self.queues[host] and self.active[host] < self.per_host:
+                job = self.queues[host].popleft()
+                # Host ans Ende der Rotation setzen
+                self.queues.move_to_end(host)
+                self.active[host] += 1
+                return host, job
+        return None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not any(self.queues.values()):
+                        return
+                    picked = self._next_job()
+                    if picked:
+                        break
+                    self.condition.wait()
+
+            host, (index, function, kwargs) = picked
+            try:
+                self.results[index] = function(**kwargs)
+            except Exception as e:
+                print(f"Error in download job: {e}")
+            finally:
+                with self.condition:
+                    self.active[host] -= 1
+                    self.condition.notify_all()
+
+    def run(self):
+        """
+        Arbeitet alle Jobs ab und gibt ihre Ergebnisse in der Reihenfolge von add() zurück.
+        """
+        total = sum(len(queue) for queue in self.queues.values())
+        workers = [threading.Thread(target=self._worker) for _ in range(min(self.jobs, total))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.results
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+verification of finished downloads
+"""
+import os
+import struct
+
+# Source.size ist bei Filmliste und API nur auf MB genau
+SIZE_TOLERANCE = 1024 * 1024
+
+def mp4_boxes(path):
+    """
+    Liest die Top-Level-Boxen einer MP4-Datei über ihre Header (nur Seeks, kein Lesen der Inhalte).
+
+    :return: (Liste der Boxtypen, True wenn die letzte Box genau am Dateiende endet)
+    """
+    boxes = []
+    end = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= end:
+            f.seek(offset)
+            size, kind = struct.unpack('>I4s', f.read(8))
+            if size == 1:
+                header = f.read(8)
+                if len(header) < 8:
+                    return boxes, False
+                size = struct.unpack('>Q', header)[0]
+            elif size == 0:
+                # Box reicht bis zum Dateiende
+                size = end - offset
+            if size < 8:
+                return boxes, False
+            boxes.append(kind.decode('latin-1'))
+            offset += size
+        return boxes, offset == end
+
+def check_mp4(path):
+    """
+    Prüft, ob eine MP4-Datei eine 'moov'-Box enthält und nicht mitten in einer Box abbricht.
+
+    :return: Ein Dictionary mit 'moov' (bool) und 'error' (None oder Beschreibung)
+    """
+    try:
+        boxes, complete = mp4_boxes(path)
+    except (OSError, struct.error) as e:
+        return {'moov': False, 'error': str(e)}
+    if not boxes or boxes[0] not in ('ftyp', 'styp', 'moov', 'free', 'skip', 'mdat'):
+        return {'moov': False, 'error': 'Not an MP4 file'}
+    if not complete:
+        return {'moov': 'moov' in boxes, 'error': 'MP4 file is truncated'}
+    if 'moov' not in boxes:
+        return {'moov': False, 'error': 'MP4 file has no moov atom'}
+    return {'moov': True, 'error': None}
+
+def verify_download(result, path, expected_size=None):
+    """
+    Prüft einen fertigen Download anhand des Ergebnisses der Download-Engine: Bytes gegen
+    Content-Length (die Engine meldet sonst keinen Erfolg), ersatzweise gegen Source.size (nur
+    Warnung), und bei MP4 die Boxstruktur. Der Hash wurde bereits beim Schreiben berechnet.
+
+    :return: Ein Dictionary mit den Spalten für download_job
+    """
+    size = os.path.getsize(path)
+    verification = {
+        'verified': True,
+        'content_length': result.get('total'),
+        'hash': result.get('hash'),
+        'mp4_moov': None,
+        'verify_error': None,
+    }
+
+    if result.get('total') is not None and size != result['total']:
+        verification.update(verified=False, verify_error=f"Size mismatch: {size} of {result['total']} bytes")
+        return verification
+    if result.get('total') is None and expected_size and abs(size - expected_size) > SIZE_TOLERANCE:
+        print(f"Warning: {path} has {size} bytes, source lists {expected_size} bytes")
+
+    if path.lower().endswith(('.mp4', '.mp4.partial', '.m4v', '.m4v.partial')):
+        mp4 = check_mp4(path)
+        verification['mp4_moov'] = mp4['moov']
+        if mp4['error']:
+            verification.update(verified=False, verify_error=mp4['error'])
+
+    return verification
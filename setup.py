@@ -36,6 +36,7 @@ setup(
     entry_points={
         "console_scripts": [
             "mdl = mdl.mdl:main",
+            "mdl-benchmark = mdl.benchmark:main",
         ],
     },
     )
\ No newline at end of file
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shared fixtures: database, local stand-ins for the API and the CDN, download jobs
+"""
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from mdl.benchmark import FakeMediathek, synthetic_mp4
+from mdl.mdl import mdownloader
+from mdl.mdldb import DataBaseManager
+
+CDN_SIZE = 64 * 1024
+
+class FlakyCdn:
+    """
+    Lokaler HTTP-Server, der unter jedem Pfad `data` mit Range-Anfragen ausliefert.
+
+    truncate: Beginn eines Bereichs -> Anzahl Bytes, nach denen die Verbindung einmalig abbricht
+    ranges:   False, wenn Range ignoriert werden soll
+    missing:  Pfade, die mit 404 beantwortet werden
+    failures: Pfad -> Statuscodes für die nächsten GET-Anfragen (None: normale Antwort)
+    delay:    Pfad -> Sekunden bis zur Antwort
+    """
+    def __init__(self, data):
+        self.data = data
+        self.truncate = {}
+        self.ranges = True
+        self.missing = set()
+        self.failures = {}
+        self.delay = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def url_for(self, path):
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    @property
+    def url(self):
+        return self.url_for('/video.mp4')
+
+    def gets(self, path=None):
+        return [k for method, p, k in self.requests if method == 'GET' and path in (None, p)]
+
+    def _handler(self):
+        cdn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, headers, head, start=0):
+                self.send_response(code)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if head:
+                    return
+                with cdn.lock:
+                    cut = cdn.truncate.pop(start, None)
+                # abgebrochene Verbindung: weniger Bytes als angekündigt
+                try:
+                    self.wfile.write(body if cut is None else body[:cut])
+                except (BrokenPipeError, ConnectionResetError):
+                    # der Client hat abgebrochen (z.B. der Verlierer beim Qualitäts-Rennen)
+                    pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                with cdn.lock:
+                    cdn.requests.append(('HEAD' if head else 'GET', self.path, self.headers.get('Range')))
+                    failures = cdn.failures.get(self.path)
+                    status = failures.pop(0) if failures and not head else None
+                time.sleep(cdn.delay.get(self.path, 0))
+                if self.path in cdn.missing:
+                    status = 404
+                if status is not None:
+                    return self._send(status, b'', {}, head)
+                data = cdn.data
+                headers = {'Accept-Ranges': 'bytes'} if cdn.ranges else {}
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+                if not cdn.ranges or not match:
+                    return self._send(200, data, headers, head)
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+                if start >= len(data):
+                    return self._send(416, b'', {'Content-Range': f'bytes */{len(data)}'}, head)
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                self._send(206, data[start:end + 1], headers, head, start=start)
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def db(tmp_path):
+    return DataBaseManager(configdir=str(tmp_path / 'config'))
+
+@pytest.fixture
+def mediathek():
+    mediathek = FakeMediathek(sources=100).start()
+    yield mediathek
+    mediathek.stop()
+
+@pytest.fixture
+def cdn():
+    cdn = FlakyCdn(synthetic_mp4(CDN_SIZE)).start()
+    yield cdn
+    cdn.stop()
+
+@pytest.fixture
+def make_downloader(tmp_path, mediathek):
+    """
+    mdownloader mit Konfiguration und Downloads unter tmp_path, gegen FakeMediathek. Ohne
+    search=... sucht der Konstruktor noch nicht (wie im Benchmark).
+    """
+    def make_downloader(**options):
+        args = dict(
+            configdir=str(tmp_path / 'config'),
+            download=str(tmp_path / 'download'),
+            api_url=mediathek.api_url,
+            series_url=mediathek.series_url,
+            search=None,
+            channel='ZDF',
+            page_size=10,
+        )
+        args.update(options)
+        return mdownloader(**args)
+    return make_downloader
+
+@pytest.fixture
+def make_job(tmp_path):
+    """
+    Download-Job in der Form nach mdownloader._prepare_job und _plan_job.
+    """
+    def make_job(source_id, size=1024, rating=None, variants=None):
+        variants = variants or [['M', f'https://cdn.example.org/video/{source_id}.mp4']]
+        basedir = str(tmp_path / 'download' / source_id)
+        return {
+            'source_id': source_id,
+            'url': variants[0][1],
+            'basedir': basedir,
+            'filename': f'{source_id}.mp4',
+            'size': size,
+            'meta': {'title': source_id, 'rating': rating},
+            'variants': variants,
+            'quality': variants[0][0],
+            'name': source_id,
+            'host': 'cdn.example.org',
+            'partial': f'{basedir}/{source_id}.mp4.partial',
+            'rating': rating,
+        }
+    return make_job
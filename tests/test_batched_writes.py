@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+write batching through a single writer thread
+"""
+import threading
+
+import pytest
+from sqlalchemy import text
+
+def _insert(source_id):
+    def write(connection):
+        connection.execute(text("INSERT INTO source (id, title) VALUES (:id, 'x')"), {'id': source_id})
+    return write
+
+def _ids(db):
+    with db.engine.connect() as connection:
+        return set(connection.execute(text("SELECT id FROM source")).scalars())
+
+def test_writes_are_flushed_on_exit(db):
+    def worker(n):
+        for i in range(50):
+            db._write(_insert(f'{n}-{i}'))
+
+    with db.batched_writes(max_pending=20, batch_size=10):
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert _ids(db) == {f'{n}-{i}' for n in range(4) for i in range(50)}
+    assert db.writes['writes'] == 200
+    assert 20 <= db.writes['batches'] < 200
+    assert db._write_queue is None
+
+def test_nested_block_uses_outer_writer(db):
+    with db.batched_writes():
+        writes = db._write_queue
+        with db.batched_writes():
+            assert db._write_queue is writes
+            db._write(_insert('a'))
+        assert db._write_queue is writes
+    assert _ids(db) == {'a'}
+
+def test_failed_write_reaches_caller(db):
+    with pytest.raises(Exception, match='UNIQUE constraint'):
+        with db.batched_writes():
+            db._write(_insert('a'))
+            db._write(_insert('a'))
+            db._write(_insert('b'))
+
+    # die übrigen Änderungen des Blocks sind trotzdem geschrieben
+    assert _ids(db) == {'a', 'b'}
+    assert db._write_queue is None
+
+def test_error_in_block_is_not_masked(db):
+    with pytest.raises(KeyError):
+        with db.batched_writes():
+            db._write(_insert('a'))
+            db._write(_insert('a'))
+            raise KeyError('body')
+    assert _ids(db) == {'a'}
+
+def test_direct_write_outside_block(db):
+    db._write(_insert('a'))
+    assert _ids(db) == {'a'}
+    assert db.writes['writes'] == 0
+
+    with pytest.raises(Exception, match='UNIQUE constraint'):
+        db._write(_insert('a'))
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+persistent download job queue
+"""
+
+def _states(db):
+    return {job['source_id']: job['state'] for job in db.get_download_jobs(states=('queued', 'failed', 'running'))}
+
+def test_enqueue_keeps_permanent_failures(db, make_job):
+    jobs = [make_job(k) for k in ['gone', 'removed', 'error', 'timeout', 'running']]
+    db.enqueue_download_jobs(jobs)
+    db.update_download_job('gone', state='failed', http_status=404)
+    db.update_download_job('removed', state='failed', http_status=410)
+    db.update_download_job('error', state='failed', http_status=500)
+    db.update_download_job('timeout', state='failed', http_status=None)
+    db.update_download_job('running', state='running')
+
+    db.enqueue_download_jobs(jobs)
+
+    assert _states(db) == {
+        'gone': 'failed',
+        'removed': 'failed',
+        'error': 'queued',
+        'timeout': 'queued',
+        'running': 'running',
+    }
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+the SQL exclusion clause against the former pandas str.contains filter
+"""
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from mdl.exclusion import EXCLUDED_TAGS, ExclusionMatcher
+from mdl.mdldb import Source
+
+TITLES = [
+    'Der Film',
+    'Der Film (Audiodeskription)',
+    'Der Film - audiodeskription',
+    'Hörfassung: Der Film',
+    'HÖRFASSUNG: Der Film',
+    'Horfassung: Der Film',
+    'Straße der Ärzte (Französisch)',
+    'Strasse der Ärzte (französisch)',
+    'Rabatt 100% sicher',
+    'Rabatt 100 sicher',
+    'Film_2020',
+    'Film 2020',
+    'Il film (ita)',
+    'Il film ita',
+    '日本の映画 (OV)',
+    '',
+]
+
+def _contains_filter(titles, tags):
+    # bisheriges Verhalten in get_links: eine str.contains-Maske pro Begriff
+    DF_links = pd.DataFrame({'title': titles})
+    for i in tags:
+        DF_links = DF_links[(~DF_links['title'].str.contains(i, regex=False))]
+    return set(DF_links['title'])
+
+def _sql_filter(db, titles, tags):
+    db.save_sources([{'id': f'id{i}', 'title': title} for i, title in enumerate(titles)])
+    query = select(Source.title).where(ExclusionMatcher(tags).sql_clause(Source.title))
+    with db.engine.connect() as connection:
+        return set(connection.execute(query).scalars())
+
+@pytest.mark.parametrize('tags', [
+    EXCLUDED_TAGS,
+    ['%'],
+    ['_'],
+    ['100%'],
+    ['Film_'],
+    ['Hörfassung', 'Ärzte'],
+    ['ÄRZTE', 'hörfassung'],
+    ['(ita)', 'Film', '(OV)'],
+    ['映画'],
+    [],
+])
+def test_sql_matches_str_contains(db, tags):
+    assert _sql_filter(db, TITLES, tags) == _contains_filter(TITLES, tags)
+
+def test_redundant_tags_are_dropped():
+    assert ExclusionMatcher(['Originalversion', '(Originalversion)', 'Film', '', 'Film']).tags == ['Film', 'Originalversion']
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HttpDownloader against FlakyCdn (dropped connections, ignored ranges)
+"""
+import json
+import os
+
+from mdl.fetcher import HttpDownloader
+
+SEGMENT = 16 * 1024
+
+def _http_downloader(segments=4):
+    return HttpDownloader(segments=segments, min_segment_size=SEGMENT, chunk_size=1024, timeout=5)
+
+def _read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def test_segmented_download(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+
+    result = _http_downloader().download(cdn.url, filename)
+
+    assert result['success'], result['error']
+    assert result['bytes'] == len(cdn.data)
+    assert _read(filename) == cdn.data
+    assert not os.path.exists(HttpDownloader.state_path(filename))
+    assert sorted(cdn.gets()) == sorted(f'bytes={k}-{k + SEGMENT - 1}' for k in range(0, len(cdn.data), SEGMENT))
+
+def test_interrupted_segment_resumes(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    cdn.truncate[SEGMENT] = 5000
+
+    result = _http_downloader().download(cdn.url, filename)
+
+    assert not result['success']
+    # Datei liegt sparse in voller Länge, der Fortschritt steht in der .state-Datei
+    assert os.path.getsize(filename) == len(cdn.data)
+    with open(HttpDownloader.state_path(filename)) as f:
+        segments = json.load(f)['segments']
+    assert [done for _, _, done in segments] == [SEGMENT, 5000, SEGMENT, SEGMENT]
+
+    cdn.requests.clear()
+    result = _http_downloader().download(cdn.url, filename)
+
+    assert result['success'], result['error']
+    assert result['resumed'] == len(cdn.data) - SEGMENT + 5000
+    assert result['bytes'] == SEGMENT - 5000
+    assert cdn.gets() == [f'bytes={SEGMENT + 5000}-{2 * SEGMENT - 1}']
+    assert _read(filename) == cdn.data
+    assert not os.path.exists(HttpDownloader.state_path(filename))
+
+def test_resume_falls_back_when_range_is_ignored(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    cdn.truncate[0] = 100
+    assert not _http_downloader().download(cdn.url, filename)['success']
+    assert os.path.exists(HttpDownloader.state_path(filename))
+
+    cdn.ranges = False
+    cdn.requests.clear()
+    result = _http_downloader().download(cdn.url, filename)
+
+    # Zustand und sparse Datei werden verworfen, die Datei kommt in einem Stück
+    assert result['success'], result['error']
+    assert result['status'] == 200
+    assert result['resumed'] == 0
+    assert cdn.gets()[-1] is None
+    assert _read(filename) == cdn.data
+    assert not os.path.exists(HttpDownloader.state_path(filename))
+
+def test_stale_state_restarts(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    cdn.truncate[0] = 100
+    _http_downloader().download(cdn.url, filename)
+
+    result = _http_downloader().download(cdn.url.replace('video.mp4', 'other.mp4'), filename)
+
+    assert result['success'], result['error']
+    assert result['resumed'] == 0
+    assert _read(filename) == cdn.data
+
+def test_stream_resume(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    with open(filename, 'wb') as f:
+        f.write(cdn.data[:1000])
+
+    result = _http_downloader(segments=1).download(cdn.url, filename)
+
+    assert result['success'], result['error']
+    assert result['status'] == 206
+    assert result['resumed'] == 1000
+    assert cdn.gets() == ['bytes=1000-']
+    assert _read(filename) == cdn.data
+
+def test_stream_complete_file_416(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    with open(filename, 'wb') as f:
+        f.write(cdn.data)
+
+    result = _http_downloader(segments=1).download(cdn.url, filename)
+
+    assert result['success'], result['error']
+    assert result['status'] == 416
+    assert result['total'] == len(cdn.data)
+
+def test_stream_size_mismatch_416(cdn, tmp_path):
+    filename = str(tmp_path / 'video.mp4.partial')
+    with open(filename, 'wb') as f:
+        f.write(cdn.data + b'trailing')
+
+    result = _http_downloader(segments=1).download(cdn.url, filename)
+
+    assert not result['success']
+    assert result['status'] == 416
+    assert 'does not match remote size' in result['error']
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+import of a locally generated Filmliste fixture
+"""
+from datetime import timedelta
+
+import pytest
+
+from mdl.filmliste import FilmlisteImporter, FilmlisteReader, write_filmliste
+
+BASE = 'https://cdn.example.org/video'
+
+def _record(i, channel, topic, title, minutes=90):
+    return {
+        'id': f'api{i}',
+        'channel': channel,
+        'topic': topic,
+        'title': title,
+        'description': f'Beschreibung {i}',
+        'timestamp': 1700000000 - i * 3600,
+        'duration': minutes * 60,
+        'size': (i + 1) * 1024 * 1024,
+        'url_website': f'https://www.example.org/film/{i}',
+        'url_subtitle': '',
+        'url_video': f'{BASE}/{i}.mp4',
+        'url_video_low': f'{BASE}/{i}_low.mp4',
+        'url_video_hd': f'{BASE}/{i}_hd.mp4',
+    }
+
+RECORDS = [
+    _record(0, 'ZDF', 'Spielfilm', 'Erster Film - Spielfilm, Deutschland 2020'),
+    # gleicher Sender und gleiches Thema: stehen in der Filmliste als leere Felder
+    _record(1, 'ZDF', 'Spielfilm', 'Zweiter Film'),
+    _record(2, 'ZDF', 'Krimi', 'Dritter Film', minutes=45),
+    _record(3, 'ARD', 'Krimi', 'Vierter Film'),
+]
+
+@pytest.fixture
+def filmliste(tmp_path):
+    path = str(tmp_path / 'filmliste.xz')
+    write_filmliste(path, RECORDS)
+    return path
+
+def _sources(db):
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT * FROM source ORDER BY timestamp DESC").mappings().all()
+    return [dict(row) for row in rows]
+
+def test_fixture_inherits_channel_and_topic(filmliste):
+    records = list(FilmlisteReader(filmliste))
+
+    assert [(k['channel'], k['topic']) for k in records] == [(k['channel'], k['topic']) for k in RECORDS]
+
+def test_import_counts(db, filmliste):
+    assert FilmlisteImporter(db).run(filmliste) == {'inserted': 4, 'updated': 0}
+    assert FilmlisteImporter(db).run(filmliste) == {'inserted': 0, 'updated': 4}
+    assert len(_sources(db)) == 4
+
+def test_import_field_mapping(db, filmliste):
+    FilmlisteImporter(db).run(filmliste)
+    sources = _sources(db)
+
+    for source, record in zip(sources, RECORDS):
+        assert source['channel'] == record['channel']
+        assert source['topic'] == record['topic']
+        assert source['title'] == record['title']
+        assert source['description'] == record['description']
+        assert source['url_website'] == record['url_website']
+        assert source['url_video'] == record['url_video']
+        # 'Url Klein' und 'Url HD' stehen relativ zu 'Url' in der Filmliste
+        assert source['url_video_low'] == record['url_video_low']
+        assert source['url_video_hd'] == record['url_video_hd']
+        assert source['url_subtitle'] is None
+        assert source['size'] == record['size']
+        assert source['fileformat'] == 'mp4'
+        assert source['imdb_parsed'] in (0, False)
+
+    records = {k['url_video']: k for k in FilmlisteReader(filmliste)}
+    assert records[RECORDS[2]['url_video']]['duration'] == timedelta(minutes=45).total_seconds()
+    assert records[RECORDS[0]['url_video']]['timestamp'] == RECORDS[0]['timestamp']
+
+def test_import_reuses_api_source(db, filmliste):
+    db.save_sources([RECORDS[0]])
+
+    assert FilmlisteImporter(db).run(filmliste) == {'inserted': 3, 'updated': 1}
+    ids = {k['url_video']: k['id'] for k in _sources(db)}
+    assert len(ids) == 4
+    assert ids[RECORDS[0]['url_video']] == 'api0'
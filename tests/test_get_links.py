@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+get_links against a local stand-in for the API
+"""
+
+def test_get_links_reports_saved_sources(make_downloader, capsys):
+    m = make_downloader()
+    m.args['search'] = 'Spielfilm'
+
+    m.get_links()
+    assert "API sources saved: 80 new, 0 updated sources" in capsys.readouterr().out
+
+    m.get_links()
+    assert "API sources saved: 0 new, 80 updated sources" in capsys.readouterr().out
+
+def test_delta_sync_stops_at_known_sources(make_downloader, mediathek):
+    m = make_downloader(delta=True)
+    m.args['search'] = 'Spielfilm'
+
+    m.get_links()
+    first = set(m.DF_links['id'])
+    assert len(first) == 80
+    assert mediathek.counts['api'] > 1
+
+    mediathek.counts.clear()
+    m.get_links()
+
+    # die erste Seite enthält nur bekannte Quellen, der Rest kommt aus der Datenbank
+    assert mediathek.counts['api'] == 1
+    assert set(m.DF_links['id']) == first
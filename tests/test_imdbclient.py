@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IMDB lookups against a local stand-in for imdb.com that throttles the title page
+"""
+import io
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from mdl.imdbclient import ImdbRetryableError
+from mdl.mdldb import IMDBEntry
+
+IMDB_ID = 'tt0000001'
+TITLE = 'Erster Film'
+
+SEARCH = f"""<html><body><section data-testid="find-results-section-title"><div><ul>
+<li><a href="/title/{IMDB_ID}/">{TITLE} 2020</a><img src="https://www.imdb.com/poster.jpg"></li>
+</ul></div></section></body></html>"""
+
+TITLE_PAGE = '<html><head><script type="application/ld+json">{}</script></head><body></body></html>'.format(json.dumps({
+    '@type': 'Movie',
+    'name': TITLE,
+    'url': f'/title/{IMDB_ID}/',
+    'genre': ['Drama'],
+    'datePublished': '2020-01-01',
+    'aggregateRating': {'ratingValue': 7.5, 'ratingCount': 1000},
+}))
+
+class FakeImdb(BaseAdapter):
+    """
+    Transport für die Session von PyMovieDb: beantwortet die Suche und die Titelseite
+    mit `title_status`.
+    """
+    def __init__(self, title_status=200):
+        super().__init__()
+        self.title_status = title_status
+        self.paths = []
+        self.responses = []
+
+    def send(self, request, **kwargs):
+        path = requests.utils.urlparse(request.url).path
+        self.paths.append(path)
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        if path.startswith('/find'):
+            response.status_code, body = 200, SEARCH
+        elif self.title_status == 200:
+            response.status_code, body = 200, TITLE_PAGE
+        else:
+            response.status_code, body = self.title_status, '<html><body>error</body></html>'
+        # wie bei urllib3: der Body liegt noch auf der Verbindung, bis er gelesen wird
+        response.raw = io.BytesIO(body.encode())
+        self.responses.append(response)
+        return response
+
+    def close(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def no_retries(db):
+    db.imdb_client.retries = 0
+
+def _mount(db, title_status):
+    adapter = FakeImdb(title_status)
+    db.imdb.session.mount('https://', adapter)
+    return adapter
+
+def _source(db):
+    db.save_sources([{
+        'id': 'api0',
+        'channel': 'ZDF',
+        'topic': 'Spielfilm',
+        'title': TITLE,
+        'description': '',
+        'timestamp': 1700000000,
+        'duration': 5400,
+        'size': 1024,
+        'url_website': 'https://www.example.org/film/0',
+        'url_subtitle': '',
+        'url_video': 'https://cdn.example.org/video/0.mp4',
+        'url_video_low': '',
+        'url_video_hd': '',
+    }])
+
+def _imdb_parsed(db):
+    with db.engine.connect() as connection:
+        return connection.exec_driver_sql("SELECT imdb_parsed, imdb_id FROM source WHERE id = 'api0'").one()
+
+def _imdb_ids(db):
+    with db.get_session() as session:
+        return [k.imdb_id for k in session.query(IMDBEntry).all()]
+
+def test_lookup_hit(db):
+    _mount(db, 200)
+    _source(db)
+
+    db.update_imdb_info_group(['api0'], title=TITLE)
+
+    assert tuple(_imdb_parsed(db)) in ((1, IMDB_ID), (True, IMDB_ID))
+    assert db.get_imdb_lookup(TITLE)['result'] == 'hit'
+
+def test_throttled_title_page_is_not_a_miss(db):
+    adapter = _mount(db, 429)
+    _source(db)
+
+    db.update_imdb_info_group(['api0'], title=TITLE)
+
+    assert f'/title/{IMDB_ID}/' in adapter.paths
+    assert db.imdb_client.stats()['throttled'] == 1
+    assert db.get_imdb_lookup(TITLE)['result'] == 'error'
+    assert not _imdb_parsed(db)[0]
+
+def test_reparse_keeps_entry_when_throttled(db):
+    _mount(db, 200)
+    db.update_imdb_info_group([], title=TITLE)
+    assert _imdb_ids(db) == [IMDB_ID]
+
+    _mount(db, 429)
+    db._reparse_imdb_item(IMDB_ID)
+    assert _imdb_ids(db) == [IMDB_ID]
+    assert db.imdb_client.stats()['throttled'] == 1
+
+    _mount(db, 404)
+    db._reparse_imdb_item(IMDB_ID)
+    assert _imdb_ids(db) == []
+    # kein gecachter Treffer auf die gelöschte ID
+    assert db.get_imdb_lookup(TITLE) is None
+
+def test_every_request_costs_a_token(db):
+    _mount(db, 200)
+    consumed = []
+    db.imdb_client.bucket.consume = consumed.append
+
+    db.imdb_client.get_by_name(TITLE)
+
+    # Suche und Titelseite
+    assert consumed == [1, 1]
+
+def test_throttled_response_is_closed(db):
+    adapter = _mount(db, 429)
+
+    with pytest.raises(ImdbRetryableError):
+        db.imdb_client.get_by_id(IMDB_ID)
+
+    throttled = [k for k in adapter.responses if k.status_code == 429]
+    assert throttled and all(k.raw.closed for k in throttled)
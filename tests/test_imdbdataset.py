@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+matching against a tiny imported IMDB dataset
+"""
+import gzip
+
+import pytest
+
+from mdl.imdbdataset import BASICS, RATINGS, ImdbDatasetImporter
+
+TITLES = """tconst	titleType	primaryTitle	originalTitle	isAdult	startYear	endYear	runtimeMinutes	genres
+tt0082096	movie	Das Boot	Das Boot	0	1981	\\N	149	Drama,War
+tt0310012	tvMovie	Das Boot	Das Boot	0	1985	\\N	90	Drama
+tt0248408	movie	Manitou's Shoe	Der Schuh des Manitu	0	2001	\\N	87	Comedy,Western
+tt5830254	tvSeries	Das Boot	Das Boot	0	2018	\\N	60	Drama
+tt0000001	short	Der Schuh des Manitu	Der Schuh des Manitu	0	2001	\\N	5	Short
+"""
+
+RATINGS_TSV = """tconst	averageRating	numVotes
+tt0082096	8.4	260000
+tt0310012	6.0	100
+tt0248408	6.3	30000
+"""
+
+@pytest.fixture
+def dataset(db, tmp_path):
+    for name, content in [(BASICS, TITLES), (RATINGS, RATINGS_TSV)]:
+        with gzip.open(tmp_path / name, 'wt', encoding='utf-8') as f:
+            f.write(content)
+    assert ImdbDatasetImporter(db).run(str(tmp_path)) == {'imdb_title': 4, 'imdb_rating': 3}
+    return db
+
+def _match(db, title, year=None, tv=False):
+    key = db._imdb_lookup_key(title, year, tv)
+    match = db.match_imdb_dataset([{'title': title, 'year': year, 'tv': tv}]).get(key)
+    return match and match['tconst']
+
+def test_match_with_year(dataset):
+    assert _match(dataset, 'Das Boot', 1981) == 'tt0082096'
+    assert _match(dataset, 'Das Boot', 1986) == 'tt0310012'
+    assert _match(dataset, 'Das Boot', 2018, tv=True) == 'tt5830254'
+    assert _match(dataset, 'Das Boot', 1990) is None
+
+def test_without_year_title_must_be_unique(dataset):
+    # zwei Filme 'Das Boot': ohne Jahr nicht entscheidbar
+    assert _match(dataset, 'Das Boot') is None
+    # als Serie gibt es nur einen
+    assert _match(dataset, 'Das Boot', tv=True) == 'tt5830254'
+
+def test_without_year_original_title(dataset):
+    # passt nur über den Originaltitel; der Kurzfilm wird nicht importiert
+    assert _match(dataset, 'Der Schuh des Manitu') == 'tt0248408'
+    assert _match(dataset, "Manitou's Shoe") == 'tt0248408'
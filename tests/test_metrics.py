@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+download metrics export
+"""
+from mdl.metrics import DownloadMetrics
+
+def _result(success=True, received=1000, duration=2.0):
+    return {'status': 200 if success else 404, 'success': success, 'bytes': received, 'resumed': 0, 'duration': duration, 'ttfb': 0.1, 'peak': None}
+
+def _samples(directory):
+    with open(directory / 'mdl.prom') as f:
+        return dict(line.rsplit(' ', 1) for line in f.read().splitlines() if not line.startswith('#'))
+
+def test_export_without_downloads_writes_zeros(tmp_path):
+    previous = DownloadMetrics()
+    previous.record([_result()], host='cdn.example.org')
+    previous.export(str(tmp_path))
+
+    DownloadMetrics().export(str(tmp_path))
+    samples = _samples(tmp_path)
+
+    assert float(samples['mdl_run_timestamp_seconds']) > 0
+    assert samples['mdl_download_transfers'] == '0'
+    assert samples['mdl_download_bytes'] == '0'
+    # keine Werte des vorherigen Laufs
+    assert not any('cdn.example.org' in k for k in samples)
+
+def test_export_totals_and_dimensions(tmp_path):
+    metrics = DownloadMetrics()
+    metrics.record([_result(success=False, received=0), _result()], host='cdn.example.org', quality='HD')
+    metrics.record([_result(received=500)], host='other.example.org', quality='HD')
+    metrics.export(str(tmp_path))
+    samples = _samples(tmp_path)
+
+    assert samples['mdl_download_transfers'] == '2'
+    assert samples['mdl_download_failures'] == '0'
+    assert samples['mdl_download_retries'] == '1'
+    assert samples['mdl_download_bytes'] == '1500'
+    assert samples['mdl_download_transfers_by_host{host="cdn.example.org"}'] == '1'
+    assert samples['mdl_download_bytes_by_quality{quality="HD"}'] == '1500'
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+concurrent offset paging with a fake session
+"""
+import threading
+import time
+
+from sqlalchemy import text
+
+from mdl.pager import QueryPager
+
+class FakeResponse:
+    def __init__(self, results):
+        self.results = results
+
+    def json(self):
+        return {'result': {'results': self.results}}
+
+class FakeSession:
+    """
+    Beantwortet POST-Anfragen aus `total` Datensätzen. Frühe Seiten antworten langsamer als
+    späte, damit die Anfragen außer der Reihe fertig werden; `fail` sind Offsets, an denen
+    ein Fehler auftritt.
+    """
+    def __init__(self, total, fail=(), delay=0.05):
+        self.records = [{'id': f'id{i:04d}'} for i in range(total)]
+        self.fail = set(fail)
+        self.delay = delay
+        self.offsets = []
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        offset, size = json['offset'], json['size']
+        with self.lock:
+            self.offsets.append(offset)
+        time.sleep(max(self.delay - offset / size * 0.01, 0))
+        with self.lock:
+            self.finished.append(offset)
+        if offset in self.fail:
+            raise ValueError(f'offset {offset} failed')
+        return FakeResponse(self.records[offset:offset + size])
+
+def _ids(pages):
+    return [k['id'] for page in pages for k in page]
+
+def test_pages_in_offset_order():
+    session = FakeSession(95)
+    pager = QueryPager([], page_size=10, concurrency=4, session=session)
+
+    pages = list(pager.pages())
+
+    assert _ids(pages) == [k['id'] for k in session.records]
+    # spätere Seiten sind vor früheren fertig geworden
+    assert session.finished != sorted(session.finished)
+    assert pager.error is None
+
+def test_stops_at_short_page():
+    session = FakeSession(25)
+    pager = QueryPager([], page_size=10, concurrency=1, session=session)
+
+    assert [len(k) for k in pager.pages()] == [10, 10, 5]
+    # keine Anfrage hinter der kurzen Seite
+    assert session.offsets == [0, 10, 20]
+
+def test_stops_at_empty_page():
+    session = FakeSession(20)
+    pager = QueryPager([], page_size=10, concurrency=1, session=session)
+
+    assert [len(k) for k in pager.pages()] == [10, 10]
+    assert session.offsets == [0, 10, 20]
+
+def test_error_stops_paging():
+    session = FakeSession(100, fail=[30])
+    pager = QueryPager([], page_size=10, concurrency=4, session=session)
+
+    pages = list(pager.pages())
+
+    # die Seiten vor dem Fehler kommen noch, spätere (auch fertige) nicht mehr
+    assert _ids(pages) == [k['id'] for k in session.records[:30]]
+    assert isinstance(pager.error, ValueError)
+
+def test_initial_window_grows():
+    session = FakeSession(100, delay=0)
+    pager = QueryPager([], page_size=10, concurrency=4, session=session, initial=1)
+
+    pages = pager.pages()
+    next(pages)
+    assert session.offsets == [0]
+    pages.close()
+
+def _newest(db):
+    with db.engine.connect() as connection:
+        return connection.execute(text("SELECT newest_timestamp FROM sync_state")).scalar()
+
+def test_error_keeps_delta_mark(make_downloader, mediathek, monkeypatch):
+    m = make_downloader(delta=True)
+    m.args['search'] = 'Spielfilm'
+    m.get_links()
+    mark = _newest(m.db)
+
+    # eine neue Quelle auf der ersten Seite, die zweite Seite schlägt fehl
+    newest = dict(mediathek.records[0], id='new', timestamp=mark + 60, url_video=mediathek.records[0]['url_video'] + '?new')
+    mediathek.records.insert(0, newest)
+    mediathek.cache.clear()
+    fetch_page = QueryPager.fetch_page
+    def failing(self, offset):
+        if offset > 0:
+            raise ValueError('API unavailable')
+        return fetch_page(self, offset)
+    monkeypatch.setattr(QueryPager, 'fetch_page', failing)
+
+    m.get_links()
+    assert _newest(m.db) == mark
+
+    monkeypatch.setattr(QueryPager, 'fetch_page', fetch_page)
+    m.get_links()
+    assert _newest(m.db) == mark + 60
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+disk space planning and reservations
+"""
+import os
+import types
+
+import pytest
+
+from mdl import planner
+from mdl.mdl import mdownloader
+from mdl.planner import SpacePlanner
+
+FREE = 100
+
+@pytest.fixture(autouse=True)
+def free(monkeypatch):
+    monkeypatch.setattr(planner, 'free_bytes', lambda path: FREE)
+
+def _names(jobs):
+    return [job['name'] for job in jobs]
+
+@pytest.fixture
+def jobs(make_job):
+    return [
+        make_job('a', 60, rating=9),
+        make_job('b', 40, rating=6),
+        make_job('c', 30, rating=5),
+        make_job('d', 10),
+    ]
+
+def test_plan_strategies_under_min_free(tmp_path, jobs):
+    # 70 Bytes oberhalb von --free
+    space = SpacePlanner(str(tmp_path), min_free=30)
+
+    assert [_names(k) for k in space.plan(jobs, strategy='order')] == [['a', 'd'], ['b', 'c']]
+    assert [_names(k) for k in space.plan(jobs, strategy='count')] == [['c', 'd'], ['a', 'b']]
+    # b + c (Bewertung 11) schlägt a + d (Bewertung 9)
+    assert [_names(k) for k in space.plan(jobs, strategy='rating')] == [['b', 'c'], ['a', 'd']]
+
+def test_plan_counts_partial_bytes(tmp_path, jobs):
+    os.makedirs(os.path.dirname(jobs[1]['partial']))
+    with open(jobs[1]['partial'], 'wb') as f:
+        f.write(b'x' * 30)
+    space = SpacePlanner(str(tmp_path), min_free=30)
+
+    selected, _ = space.plan(jobs, strategy='order')
+
+    assert _names(selected) == ['a', 'b']
+    assert jobs[1]['need'] == 10
+
+def test_plan_nothing_fits(tmp_path, jobs):
+    space = SpacePlanner(str(tmp_path), min_free=FREE + 1)
+
+    for strategy in ['order', 'count', 'rating']:
+        assert space.plan(jobs, strategy=strategy)[0] == []
+
+def test_resize_grows_and_shrinks(tmp_path, make_job):
+    space = SpacePlanner(str(tmp_path))
+    a, b, c = make_job('a', 50), make_job('b', 30), make_job('c', 60)
+    assert space.reserve('a', a)
+    assert space.reserve('b', b)
+
+    assert not space.resize('a', a, 80)
+    assert a['size'] == 50
+    assert space.resize('a', a, 70)
+    assert space.outstanding() == 100
+
+    assert space.resize('a', a, 10)
+    assert a['size'] == 10
+    assert space.reserve('c', c)
+    assert space.outstanding() == 100
+
+def test_release_frees_reservation(tmp_path, make_job):
+    space = SpacePlanner(str(tmp_path))
+    a, b = make_job('a', 80), make_job('b', 30)
+    assert space.reserve('a', a)
+    assert not space.reserve('b', b)
+
+    space.release('a')
+
+    assert space.outstanding() == 0
+    assert space.reserve('b', b)
+
+@pytest.mark.parametrize('wget', [lambda job: False, lambda job: 1 / 0])
+def test_download_job_releases_on_failure(tmp_path, make_job, wget):
+    job = make_job('a', 80)
+    m = types.SimpleNamespace(args={'q': True}, planner=SpacePlanner(str(tmp_path)), wget=wget)
+
+    try:
+        assert not mdownloader._download_job(m, job)
+    except ZeroDivisionError:
+        pass
+
+    assert m.planner.active == {}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+quality fallback and variant racing in mdownloader.wget against FlakyCdn
+"""
+import os
+
+import pytest
+
+from mdl.planner import SpacePlanner
+
+@pytest.fixture
+def downloader(make_downloader):
+    def downloader(**options):
+        m = make_downloader(**options)
+        m.ensure_dir(m.args['download'])
+        m.planner = SpacePlanner(m.args['download'])
+        return m
+    return downloader
+
+def _job(make_job, cdn, qualities):
+    variants = [[quality, cdn.url_for(f'/video_{quality}.mp4')] for quality in qualities]
+    return make_job('a', size=len(cdn.data), variants=variants)
+
+def _read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def test_fallback_after_404(downloader, make_job, cdn):
+    m = downloader()
+    job = _job(make_job, cdn, ['M', 'L'])
+    cdn.missing.add('/video_M.mp4')
+    assert m.planner.reserve(job['source_id'], job)
+
+    assert m.wget(job)
+
+    assert job['quality'] == 'L'
+    # 404 ist endgültig: kein zweiter Versuch mit derselben Qualität
+    assert cdn.gets('/video_M.mp4') == [None]
+    assert _read(os.path.join(job['basedir'], job['filename'])) == cdn.data
+    assert not os.path.exists(job['partial'])
+
+def test_fallback_moves_reservation(downloader, make_job, cdn):
+    m = downloader()
+    job = _job(make_job, cdn, ['M', 'L'])
+    job['size'] = 10
+    cdn.missing.add('/video_M.mp4')
+    assert m.planner.reserve(job['source_id'], job)
+
+    assert m.wget(job)
+
+    # die Prüfung und die Reservierung nutzen die Größe der geladenen Qualität
+    assert job['size'] == len(cdn.data)
+    assert m.planner.active['a']['size'] == len(cdn.data)
+
+def test_partial_is_kept_when_variant_fails_after_writing(downloader, make_job, cdn):
+    m = downloader()
+    job = _job(make_job, cdn, ['M', 'L'])
+    cdn.truncate[0] = 1000
+    cdn.failures['/video_M.mp4'] = [None, 503, 503]
+    assert m.planner.reserve(job['source_id'], job)
+
+    assert not m.wget(job)
+
+    # der Fortschritt bleibt für den nächsten Lauf, keine andere Qualität
+    assert os.path.getsize(job['partial']) == 1000
+    assert job['quality'] == 'M'
+    assert cdn.gets('/video_L.mp4') == []
+
+    assert m.wget(job)
+    assert cdn.gets('/video_M.mp4')[-1] == 'bytes=1000-'
+    assert _read(os.path.join(job['basedir'], job['filename'])) == cdn.data
+
+def test_race_picks_faster_higher_quality(downloader, make_job, cdn):
+    m = downloader(race=True)
+    job = _job(make_job, cdn, ['M', 'H', 'L'])
+    cdn.delay['/video_M.mp4'] = 1.0
+    assert m.planner.reserve(job['source_id'], job)
+
+    assert m.wget(job)
+
+    assert job['quality'] == 'H'
+
+def test_race_never_picks_lower_quality(downloader, make_job, cdn):
+    m = downloader(race=True)
+    job = _job(make_job, cdn, ['M', 'L'])
+    cdn.delay['/video_M.mp4'] = 0.5
+    assert m.planner.reserve(job['source_id'], job)
+
+    assert m.wget(job)
+
+    assert job['quality'] == 'M'
+    assert cdn.gets('/video_L.mp4') == []
+
+def test_race_winner(make_downloader, cdn):
+    fetcher = make_downloader().fetcher
+    urls = [cdn.url_for(f'/video_{k}.mp4') for k in range(3)]
+    cdn.delay['/video_0.mp4'] = 1.0
+    cdn.missing.add('/video_1.mp4')
+
+    assert fetcher.race(urls) == 2
+
+    cdn.missing.update(['/video_0.mp4', '/video_2.mp4'])
+    assert fetcher.race(urls) is None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+local search over the source table (FTS5 with LIKE fallback)
+"""
+import pytest
+from sqlalchemy import text
+
+from mdl.exclusion import ExclusionMatcher
+
+SOURCES = [
+    {'id': 'a', 'channel': 'ZDF', 'topic': 'Filme im Ersten', 'title': 'Der Fall', 'timestamp': 3},
+    {'id': 'b', 'channel': 'ZDFneo', 'topic': 'Krimi', 'title': 'Spielfilm am Abend', 'timestamp': 2},
+    {'id': 'c', 'channel': 'ARD', 'topic': 'Doku', 'title': 'Natur (Audiodeskription)', 'timestamp': 1},
+]
+
+@pytest.fixture
+def sources(db):
+    assert db.fts_enabled
+    db.save_sources(SOURCES)
+    return db
+
+def _fts(db, match):
+    with db.engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT source.id FROM source_fts JOIN source ON source.fts_rowid = source_fts.rowid "
+            "WHERE source_fts MATCH :match ORDER BY source.id"), {'match': match})
+        return [row[0] for row in rows]
+
+def test_prefix_match(sources):
+    # 'Film' ist Präfix von 'Filme', 'ZDF' von 'ZDFneo'
+    assert sources.search_sources(search=['Film']) == ['a']
+    assert sorted(sources.search_sources(channel=['zdf'])) == ['a', 'b']
+
+def test_substring_falls_back_to_like(sources):
+    # nur als Teil von 'Spielfilm' enthalten: kein Token-Treffer
+    assert sources.search_sources(search=['ielfil']) == ['b']
+    assert sources.search_sources(search=['Krim'], channel=['neo']) == ['b']
+    assert sources.search_sources(search=['gibt es nicht']) == []
+
+def test_exclusion_in_both_paths(sources):
+    exclude = ExclusionMatcher(['Audiodeskription'])
+
+    assert sources.search_sources(search=['Natur'], exclude=exclude) == []
+    assert sources.search_sources(search=['atur'], exclude=exclude) == []
+    assert sources.search_sources(search=['Natur']) == ['c']
+
+def test_triggers_keep_index_in_sync(sources):
+    assert _fts(sources, 'Fall') == ['a']
+
+    # insert
+    sources.save_sources([{'id': 'd', 'channel': 'ZDF', 'topic': 'Serie', 'title': 'Neuer Fall', 'timestamp': 4}])
+    assert _fts(sources, 'Fall') == ['a', 'd']
+
+    # update
+    sources.save_sources([{'id': 'a', 'channel': 'ZDF', 'topic': 'Filme im Ersten', 'title': 'Der Schatz', 'timestamp': 3}])
+    assert _fts(sources, 'Fall') == ['d']
+    assert _fts(sources, 'Schatz') == ['a']
+
+    # delete
+    with sources.engine.begin() as connection:
+        connection.execute(text("DELETE FROM source WHERE id = 'd'"))
+    assert _fts(sources, 'Fall') == []
+    assert _fts(sources, 'Serie') == []
+
+    # der Index ist konsistent mit der Tabelle
+    with sources.engine.begin() as connection:
+        connection.execute(text("INSERT INTO source_fts(source_fts, rank) VALUES ('integrity-check', 1)"))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+verification of finished downloads with small synthetic MP4 box streams
+"""
+import hashlib
+import struct
+
+import pytest
+
+from mdl.fetcher import HttpDownloader
+from mdl.verify import SIZE_TOLERANCE, check_mp4, mp4_boxes, verify_download
+
+def _box(kind, payload=b''):
+    return struct.pack('>I4s', len(payload) + 8, kind) + payload
+
+def _box64(kind, payload=b''):
+    # size == 1: die Größe steht als 64-Bit-Wert hinter dem Typ
+    return struct.pack('>I4sQ', 1, kind, len(payload) + 16) + payload
+
+MP4 = _box(b'ftyp', b'isom\x00\x00\x02\x00') + _box(b'mdat', b'\x00' * 1000) + _box(b'moov', b'\x00' * 100)
+
+@pytest.fixture
+def write(tmp_path):
+    def write(data, name='video.mp4.partial'):
+        path = str(tmp_path / name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+    return write
+
+def _result(total=None, hash=None):
+    return {'total': total, 'hash': hash}
+
+def test_boxes(write):
+    assert mp4_boxes(write(MP4)) == (['ftyp', 'mdat', 'moov'], True)
+
+def test_boxes_64bit_and_to_end_of_file(write):
+    # size == 0: die letzte Box reicht bis zum Dateiende
+    data = _box(b'ftyp', b'isom') + _box64(b'mdat', b'\x00' * 50) + struct.pack('>I4s', 0, b'moov') + b'\x00' * 20
+
+    assert mp4_boxes(write(data)) == (['ftyp', 'mdat', 'moov'], True)
+    assert check_mp4(write(data)) == {'moov': True, 'error': None}
+
+def test_valid_download(write):
+    path = write(MP4)
+
+    verification = verify_download(_result(total=len(MP4), hash='sha256:abc'), path)
+
+    assert verification == {
+        'verified': True,
+        'content_length': len(MP4),
+        'hash': 'sha256:abc',
+        'mp4_moov': True,
+        'verify_error': None,
+    }
+
+def test_truncated_mp4(write):
+    path = write(MP4[:-10])
+
+    verification = verify_download(_result(), path)
+
+    assert not verification['verified']
+    assert verification['verify_error'] == 'MP4 file is truncated'
+    assert verification['mp4_moov'] is True
+
+def test_truncated_inside_box_header(write):
+    assert check_mp4(write(MP4 + b'\x00\x00\x00'))['error'] == 'MP4 file is truncated'
+
+def test_missing_moov(write):
+    path = write(_box(b'ftyp', b'isom') + _box(b'mdat', b'\x00' * 100))
+
+    verification = verify_download(_result(), path)
+
+    assert not verification['verified']
+    assert verification['verify_error'] == 'MP4 file has no moov atom'
+    assert verification['mp4_moov'] is False
+
+def test_not_an_mp4(write):
+    path = write(b'<html>Not found</html>' + b' ' * 100)
+
+    verification = verify_download(_result(), path)
+
+    assert not verification['verified']
+    assert verification['verify_error'] == 'Not an MP4 file'
+
+def test_size_mismatch(write):
+    path = write(MP4)
+
+    verification = verify_download(_result(total=len(MP4) + 1), path)
+
+    assert not verification['verified']
+    assert verification['verify_error'] == f'Size mismatch: {len(MP4)} of {len(MP4) + 1} bytes'
+
+def test_expected_size_only_warns(write, capsys):
+    path = write(MP4)
+
+    verification = verify_download(_result(), path, expected_size=len(MP4) + 2 * SIZE_TOLERANCE)
+
+    assert verification['verified']
+    assert 'Warning' in capsys.readouterr().out
+    assert verify_download(_result(), path, expected_size=len(MP4) + SIZE_TOLERANCE)['verified']
+
+def test_other_formats_skip_box_check(write):
+    path = write(b'WEBVTT\n', name='video.vtt')
+
+    verification = verify_download(_result(total=7), path)
+
+    assert verification['verified']
+    assert verification['mp4_moov'] is None
+
+def test_hash_is_computed_while_writing_and_resuming(cdn, tmp_path):
+    path = str(tmp_path / 'video.mp4.partial')
+    with open(path, 'wb') as f:
+        f.write(cdn.data[:1000])
+    fetcher = HttpDownloader(hash_algorithm='sha256', chunk_size=1024)
+
+    result = fetcher.download(cdn.url, path)
+
+    assert result['resumed'] == 1000
+    assert result['hash'] == 'sha256:' + hashlib.sha256(cdn.data).hexdigest()
+    assert verify_download(result, path)['hash'] == result['hash']